@@ -0,0 +1,75 @@
+from .graph import PACKAGE, GROUP, VDEP
+
+# values of the aggregate option
+AGGREGATE_MODES = ("scc", "group", "section")
+
+# section clusters of the nodes that are not packages
+KIND_SECTIONS = {GROUP: "package groups", VDEP: "virtual dependencies"}
+
+
+class Clustering:
+    """ Some nodes partitioned into clusters, each with a key that stays
+    the same across versions of the db. Nodes in no cluster stay alone. """
+
+    def __init__(self):
+        self.keys = []
+        self.members = []
+        # node -> index of its cluster
+        self.cluster_of = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key, members):
+        cid = len(self.keys)
+        self.keys.append(key)
+        self.members.append(members)
+        for node in members:
+            self.cluster_of[node] = cid
+
+
+def cluster_key(dbinfo, node, mode):
+    graph = dbinfo.graph
+    kind = graph.kinds[node]
+    if mode == "scc":
+        members = dbinfo.condensation.members(node)
+        # named after the root, which lists the circle
+        return graph.names[members[-1]] if len(members) > 1 else None
+    if mode == "group":
+        if kind == GROUP:
+            return graph.names[node]
+        if kind == PACKAGE and graph.packages[node].groups:
+            return graph.packages[node].groups[0]
+        return None
+    if kind == PACKAGE:
+        return graph.packages[node].section
+    return KIND_SECTIONS[kind]
+
+
+def cluster_nodes(dbinfo, nodes, mode, expand=()):
+    """ Clustering of `nodes` by dependency circle, first group or
+    section, leaving out the clusters whose keys are in `expand` and
+    clusters of a single node. """
+    buckets = {}
+    for node in nodes:
+        key = cluster_key(dbinfo, node, mode)
+        if key is not None and key not in expand:
+            buckets.setdefault(key, []).append(node)
+    clustering = Clustering()
+    for key, members in buckets.items():
+        if len(members) > 1:
+            clustering.add(key, members)
+    return clustering
+
+
+def cluster_edges(sources, targets_of, node_id):
+    """ Edges between the ids `node_id` gives the nodes, merged, as
+    (from, to, number of edges), leaving out edges inside an id. """
+    counts = {}
+    for node in sources:
+        src = node_id(node)
+        for target in targets_of(node):
+            dst = node_id(target)
+            if dst is not None and dst != src:
+                counts[src, dst] = counts.get((src, dst), 0) + 1
+    return [(src, dst, count) for (src, dst), count in counts.items()]
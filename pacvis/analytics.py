@@ -0,0 +1,253 @@
+import json
+import sqlite3
+import itertools
+from time import perf_counter
+from types import SimpleNamespace
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .cache import GraphCache, GRAPH_OPTIONS
+from .console import start_message, append_message, print_message
+from .graph import Condensation, closure_sizes, PACKAGE
+from .render import DEFAULT_OPTIONS
+
+DAMPING = 0.85
+# PageRank stops once the ranks move less than this in total
+TOLERANCE = 1e-10
+MAX_ITERATIONS = 200
+# packages listed by each ranking unless asked otherwise
+TOP = 20
+
+
+def available():
+    return np is not None
+
+
+def dependency_edges(graph):
+    """ (source, target) index arrays of the depends edges """
+    offsets = np.frombuffer(graph.dep_offsets, dtype=np.int32)
+    sources = np.repeat(np.arange(len(graph), dtype=np.int32),
+                        np.diff(offsets))
+    return sources, np.frombuffer(graph.dep_targets, dtype=np.int32)
+
+
+def pagerank(nnodes, sources, targets, damping=DAMPING):
+    """ PageRank with every node passing its rank on to its dependencies,
+    so that what many packages need, directly or not, ranks high. Nodes
+    without dependencies spread their rank over all nodes. Returns the
+    ranks and the number of iterations. """
+    outdegree = np.bincount(sources, minlength=nnodes)
+    share = 1.0 / np.maximum(outdegree, 1)
+    dangling = outdegree == 0
+    rank = np.full(nnodes, 1.0 / nnodes)
+    for iteration in range(1, MAX_ITERATIONS + 1):
+        flow = np.bincount(targets, weights=(rank * share)[sources],
+                           minlength=nnodes)
+        spread = rank[dangling].sum() / nnodes
+        new = (1 - damping) / nnodes + damping * (flow + spread)
+        delta = np.abs(new - rank).sum()
+        rank = new
+        if delta < TOLERANCE:
+            break
+    return rank, iteration
+
+
+def reversed_condensation(condensation):
+    """ the condensation with its edges reversed, numbered backwards so
+    that components still come after the ones they point to """
+    last = len(condensation) - 1
+    dependents = condensation.dependents()
+    return Condensation(condensation.components[::-1], None,
+                        [[last - cid for cid in dependents[last - rid]]
+                         for rid in range(last + 1)])
+
+
+def chain_depths(comp_levels, sources, targets):
+    """ Components on the longest chain of dependencies from each
+    component, for component edges `sources` -> `targets`. Levels of
+    topology_sort are higher for dependents, so relaxing the edges one
+    source level at a time, lowest first, sees every dependency final. """
+    depth = np.ones(len(comp_levels), dtype=np.int64)
+    order = np.argsort(comp_levels[sources], kind="stable")
+    sources, targets = sources[order], targets[order]
+    levels = comp_levels[sources]
+    bounds = np.flatnonzero(np.r_[True, levels[1:] != levels[:-1], True])
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        np.maximum.at(depth, sources[start:end],
+                      depth[targets[start:end]] + 1)
+    return depth
+
+
+class GraphAnalytics:
+    """ Per node hub measures and whole graph distributions of a DbInfo,
+    computed in one batch over numpy arrays of the graph. """
+
+    def __init__(self, dbinfo):
+        start = perf_counter()
+        graph = dbinfo.graph
+        condensation = dbinfo.condensation
+        nnodes = len(graph)
+        self.dbinfo = dbinfo
+        self.packages = np.array(graph.kinds) == PACKAGE
+        sources, targets = dependency_edges(graph)
+        self.fanout = np.bincount(sources, minlength=nnodes)
+        self.fanin = np.bincount(targets, minlength=nnodes)
+        self.pagerank, self.iterations = pagerank(nnodes, sources, targets)
+
+        components = condensation.components
+        sizes = np.array([len(component) for component in components],
+                         dtype=np.int64)
+        members = np.fromiter(itertools.chain.from_iterable(components),
+                              dtype=np.int64, count=nnodes)
+        component_of = np.empty(nnodes, dtype=np.int64)
+        component_of[members] = np.repeat(np.arange(len(components)), sizes)
+        self.component_of = component_of
+        self.component_sizes = sizes
+        # packages in each component, what the transitive counts count
+        weights = np.bincount(component_of, weights=self.packages,
+                              minlength=len(condensation)).astype(np.int64)
+        weights = weights.tolist()
+        fanin = np.array(closure_sizes(reversed_condensation(condensation),
+                                       weights[::-1])[::-1], dtype=np.int64)
+        fanout = np.array(closure_sizes(condensation, weights),
+                          dtype=np.int64)
+        # packages depending on each node, or that it depends on, directly
+        # or not, without itself
+        self.transitive_fanin = fanin[component_of] - self.packages
+        self.transitive_fanout = fanout[component_of] - self.packages
+
+        levels = np.frombuffer(graph.level, dtype=np.int32)
+        self.levels = levels
+        roots = members[np.cumsum(sizes) - 1]
+        csources, ctargets = component_of[sources], component_of[targets]
+        between = csources != ctargets
+        self.depths = chain_depths(levels[roots], csources[between],
+                                   ctargets[between])
+        self.roots = roots
+        self.seconds = perf_counter() - start
+
+    def top(self, values, count):
+        """ the `count` packages with the highest `values` """
+        nodes = np.flatnonzero(self.packages)
+        values = values[nodes]
+        count = min(count, len(nodes))
+        if count <= 0:
+            return []
+        best = np.argpartition(-values, count - 1)[:count]
+        best = best[np.lexsort((best, -values[best]))]
+        names = self.dbinfo.graph.names
+        return [{"name": names[nodes[i]], "value": values[i].item()}
+                for i in best]
+
+    def longest_chain(self):
+        """ names of the components, by their root, on a longest chain """
+        if not len(self.depths):
+            return []
+        edges = self.dbinfo.condensation.edges
+        cid = int(np.argmax(self.depths))
+        chain = [cid]
+        while self.depths[cid] > 1:
+            cid = next(int(dep) for dep in edges[cid]
+                       if self.depths[dep] == self.depths[cid] - 1)
+            chain.append(cid)
+        names = self.dbinfo.graph.names
+        return [names[self.roots[cid]] for cid in chain]
+
+    def as_dict(self, count=TOP):
+        sizes, ncomps = np.unique(self.component_sizes, return_counts=True)
+        largest = np.argsort(-self.component_sizes, kind="stable")[:count]
+        names = self.dbinfo.graph.names
+        chain = self.longest_chain()
+        return {
+            "nodes": len(self.packages),
+            "packages": int(self.packages.sum()),
+            "edges": int(self.fanout.sum()),
+            "seconds": self.seconds,
+            "pagerank_iterations": self.iterations,
+            "levels": np.bincount(self.levels).tolist(),
+            "components": {
+                "count": len(self.component_sizes),
+                "circles": int((self.component_sizes > 1).sum()),
+                "sizes": dict(zip(sizes.tolist(), ncomps.tolist())),
+                "largest": [{"name": names[self.roots[cid]],
+                             "size": int(self.component_sizes[cid])}
+                            for cid in largest
+                            if self.component_sizes[cid] > 1],
+            },
+            "longest_chain": {"length": len(chain), "chain": chain},
+            "top": {
+                "pagerank": self.top(self.pagerank, count),
+                "transitive_fanin": self.top(self.transitive_fanin, count),
+                "fanin": self.top(self.fanin, count),
+                "transitive_fanout": self.top(self.transitive_fanout, count),
+                "fanout": self.top(self.fanout, count),
+            },
+        }
+
+
+def graph_analytics(dbinfo):
+    """ the GraphAnalytics of `dbinfo`, computed on first use """
+    if dbinfo.analytics is None:
+        start_message("Computing analytics ... ")
+        dbinfo.analytics = GraphAnalytics(dbinfo)
+        append_message("%.3fs" % dbinfo.analytics.seconds)
+    return dbinfo.analytics
+
+
+def print_report(data):
+    print("%d nodes, %d packages, %d dependencies, analyzed in %.3fs" % (
+        data["nodes"], data["packages"], data["edges"], data["seconds"]))
+    components = data["components"]
+    print("%d components, %d dependency circles, largest: %s" % (
+        components["count"], components["circles"],
+        ", ".join("%s (%d)" % (c["name"], c["size"])
+                  for c in components["largest"][:5]) or "-"))
+    chain = data["longest_chain"]
+    print("longest chain, %d components: %s" % (chain["length"],
+                                                " -> ".join(chain["chain"])))
+    print("packages per level: %s" % " ".join(map(str, data["levels"])))
+    for ranking, items in data["top"].items():
+        print()
+        print("top %s:" % ranking)
+        for item in items:
+            value = item["value"]
+            print("  %-32s %s" % (item["name"], "%.6f" % value
+                                  if isinstance(value, float) else value))
+
+
+def add_arguments(parser):
+    parser.add_argument("--top", type=int, default=TOP,
+                        help="packages listed by each ranking")
+    parser.add_argument("--json", action="store_true",
+                        help="print the report as JSON")
+    parser.add_argument("--no-snapshot", action="store_true",
+                        help="neither read nor write graph snapshots")
+    options = parser.add_argument_group("graph options")
+    for key in GRAPH_OPTIONS:
+        options.add_argument("--" + key, action="store_true")
+
+
+def run(args, dbs):
+    """ print the report for the first of the databases `dbs` """
+    if not available():
+        print_message("numpy is not installed")
+        return 1
+    options = dict(DEFAULT_OPTIONS)
+    options.update((key, getattr(args, key)) for key in GRAPH_OPTIONS)
+    db = next(iter(dbs.values()))
+    try:
+        dbinfo = GraphCache(maxentries=1, snapshots=not args.no_snapshot,
+                            loader=args.loader).get(
+                                db, SimpleNamespace(**options))
+    except (OSError, sqlite3.Error) as e:
+        print_message("Cannot read %s: %s" % (db, e))
+        return 1
+    data = graph_analytics(dbinfo).as_dict(args.top)
+    if args.json:
+        print(json.dumps(data, indent=2))
+    else:
+        print_report(data)
+    return 0
@@ -0,0 +1,3 @@
+from .synthetic import make_synthetic_db, make_synthetic_graph, make_versions
+from .stages import StageRecorder, run_stages
+from .cli import main
@@ -0,0 +1,233 @@
+import os
+import sys
+import json
+import argparse
+import platform
+import random
+import tempfile
+
+try:
+    from distutils.version import LooseVersion
+except ImportError:
+    LooseVersion = None
+
+from ..infos import AbbsDB, DbInfo, LOADERS, DEP_OPERATORS
+from ..graph import condense
+from ..version import version_key
+from .synthetic import make_synthetic_db, make_synthetic_graph, make_versions
+from .stages import StageRecorder, run_stages
+
+
+def bench_resolve(args, recorder):
+    with recorder.stage("load"):
+        abbsdb = AbbsDB(args.db)
+    deps = [dep for pkg in abbsdb.packages
+            for dep in pkg.depends + pkg.optdepends]
+    # also exercise the versioned constraint path
+    versioned = [dep + ">=0" for dep in deps]
+    with recorder.stage("resolve"):
+        resolved = sum(abbsdb.find_satisfier(dep) is not None for dep in deps)
+    with recorder.stage("resolve_versioned"):
+        resolved_ver = sum(abbsdb.find_satisfier(dep) is not None
+                           for dep in versioned)
+    return {"packages": len(abbsdb.packages), "dependencies": len(deps),
+            "resolved": resolved, "resolved_versioned": resolved_ver}
+
+
+def bench_scc(args, recorder):
+    with recorder.stage("generate"):
+        adj = make_synthetic_graph(args.packages, args.avgdeps, args.cycles,
+                                   args.seed)
+    with recorder.stage("condense"):
+        condensation = condense(range(len(adj)), adj.__getitem__)
+    return {"nodes": len(adj), "edges": sum(map(len, adj)),
+            "components": len(condensation),
+            "largest_component": max(map(len, condensation.components))}
+
+
+def bench_version(args, recorder):
+    """ The LooseVersion comparisons dependency matching did before,
+    against parsing each version once and comparing the keys. """
+    with recorder.stage("generate"):
+        versions = make_versions(args.packages, args.seed)
+        rand = random.Random(args.seed)
+        constraints = [(version, rand.choice(sorted(DEP_OPERATORS)),
+                        rand.choice(versions)) for version in versions]
+    result = {"versions": len(versions),
+              "distinct": len(set(versions))}
+    if LooseVersion is not None:
+        with recorder.stage("looseversion"):
+            loose = []
+            for version, op, depver in constraints:
+                try:
+                    loose.append(DEP_OPERATORS[op](LooseVersion(version),
+                                                   LooseVersion(depver)))
+                except TypeError:
+                    loose.append(None)
+        result["loose_errors"] = loose.count(None)
+    with recorder.stage("parse_keys"):
+        keys = {version: version_key(version) for version in versions}
+    with recorder.stage("compare_keys"):
+        matched = [DEP_OPERATORS[op](keys[version], keys[depver])
+                   for version, op, depver in constraints]
+    result["satisfied"] = sum(matched)
+    if LooseVersion is not None:
+        result["differ_from_loose"] = sum(
+            a is not None and a != b for a, b in zip(loose, matched))
+    return result
+
+
+def bench_hub(args, recorder):
+    """ find_all on dbs where one vdep has `--hub`, twice and four times
+    as many providers and dependents. Linear construction keeps the
+    seconds per edge flat. """
+    result = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for scale in (1, 2, 4):
+            hub = args.hub * scale
+            db = make_synthetic_db(
+                os.path.join(tmpdir, "hub%d.db" % hub), max(args.packages,
+                                                            2 * hub),
+                args.avgdeps, args.provides, args.cycles, args.bases,
+                args.basesize, args.optdeps, args.seed, hub)
+            dbinfo = DbInfo(db, LOADERS[args.loader](db))
+            with recorder.stage("find_all_hub%d" % hub):
+                dbinfo.find_all(args.showallvdeps)
+            graph = dbinfo.graph
+            edges = len(graph.dep_targets) + len(graph.opt_targets)
+            seconds = recorder.stages[-1]["seconds"]
+            result["edges_hub%d" % hub] = edges
+            result["us_per_edge_hub%d" % hub] = round(1e6 * seconds / edges, 3)
+    return result
+
+
+def bench_pipeline(args, recorder):
+    dbinfo, payload = run_stages(args.db, recorder, usemagic=args.usemagic,
+                                 aligntop=args.aligntop,
+                                 showallvdeps=args.showallvdeps,
+                                 serverlayout=args.layout,
+                                 loader=args.loader)
+    graph = dbinfo.graph
+    return {"nodes": len(graph),
+            "edges": len(graph.dep_targets) + len(graph.opt_targets),
+            "components": len(dbinfo.condensation),
+            "largest_component": max(map(len,
+                                         dbinfo.condensation.components)),
+            "graph_bytes": graph.nbytes(),
+            "payload_bytes": payload}
+
+
+BENCHMARKS = {
+    "resolve": bench_resolve,
+    "scc": bench_scc,
+    "pipeline": bench_pipeline,
+    "version": bench_version,
+    "hub": bench_hub,
+}
+
+# benchmarks that read an abbs.db
+DB_BENCHMARKS = {"resolve", "pipeline"}
+
+# arguments that shape the synthetic input, recorded in the report
+PARAMETERS = ("packages", "avgdeps", "optdeps", "provides", "cycles",
+              "bases", "basesize", "hub", "seed", "usemagic", "aligntop",
+              "showallvdeps", "layout",
+              "loader", "memory", "db")
+
+
+def megabytes(value):
+    return "-" if value is None else "%.1f" % (value / (1 << 20))
+
+
+def print_report(report):
+    for key, value in report["result"].items():
+        print("%-18s %s" % (key + ":", value))
+    print("%-18s %9s %10s %10s %10s" % ("stage", "seconds", "peak MiB",
+                                        "kept MiB", "rss MiB"))
+    for stage in report["stages"]:
+        print("%-18s %9.3f %10s %10s %10s" % (
+            stage["stage"], stage["seconds"],
+            megabytes(stage["peak_bytes"]),
+            megabytes(stage["retained_bytes"]),
+            megabytes(stage["maxrss_bytes"])))
+    print("%-18s %9.3f" % ("total", report["total_seconds"]))
+
+
+def run(args):
+    recorder = StageRecorder(args.memory)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if args.bench in DB_BENCHMARKS and not args.db:
+            with recorder.stage("generate_db"):
+                args.db = make_synthetic_db(
+                    os.path.join(tmpdir, "abbs.db"), args.packages,
+                    args.avgdeps, args.provides, args.cycles, args.bases,
+                    args.basesize, args.optdeps, args.seed, args.hub)
+            synthetic = True
+        else:
+            synthetic = False
+        recorder.start()
+        try:
+            result = BENCHMARKS[args.bench](args, recorder)
+        finally:
+            recorder.stop()
+        parameters = {key: getattr(args, key) for key in PARAMETERS}
+        if synthetic:
+            parameters["db"] = None
+    return {
+        "benchmark": args.bench,
+        "python": platform.python_version(),
+        "parameters": parameters,
+        "result": result,
+        "stages": recorder.stages,
+        "total_seconds": recorder.total(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark pacvis on a synthetic abbs.db")
+    parser.add_argument("bench", choices=sorted(BENCHMARKS))
+    parser.add_argument("-n", "--packages", type=int, default=20000)
+    parser.add_argument("--avgdeps", type=int, default=4,
+                        help="average dependencies per package")
+    parser.add_argument("--optdeps", type=float, default=0.1,
+                        help="fraction of dependencies that are recommends")
+    parser.add_argument("--provides", type=float, default=0.05,
+                        help="fraction of packages providing a virtual name")
+    parser.add_argument("--cycles", type=int, default=100,
+                        help="dependency circles to add")
+    parser.add_argument("--bases", type=int, default=0,
+                        help="packages of the bases section")
+    parser.add_argument("--basesize", type=int, default=20,
+                        help="packages in the group of each bases package")
+    parser.add_argument("--hub", type=int, default=0,
+                        help="packages providing, and depending on, one "
+                        "vdep (1000 for the hub benchmark)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--usemagic", action="store_true")
+    parser.add_argument("--aligntop", action="store_true")
+    parser.add_argument("--showallvdeps", action="store_true")
+    parser.add_argument("--layout", action="store_true",
+                        help="include the server side layout (needs numpy)")
+    parser.add_argument("--memory", action="store_true",
+                        help="trace allocations (slows down the run)")
+    parser.add_argument("--loader", default="python", choices=sorted(LOADERS),
+                        help="how the pipeline benchmark loads the db")
+    parser.add_argument("--db", help="use an existing abbs.db instead")
+    parser.add_argument("--json", action="store_true",
+                        help="print the report as JSON")
+    parser.add_argument("-o", "--output",
+                        help="also write the JSON report to this file")
+    args = parser.parse_args(argv)
+    if args.bench == "hub" and not args.hub:
+        args.hub = 1000
+    report = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(report)
+    return 0
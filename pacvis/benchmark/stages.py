@@ -0,0 +1,95 @@
+import tracemalloc
+from time import perf_counter
+from types import SimpleNamespace
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from ..infos import DbInfo, LOADERS
+from ..layout import compute_layout
+from ..render import iter_graph_lines, DEFAULT_OPTIONS
+
+
+def maxrss():
+    """ high water mark of the resident set of this process in bytes """
+    if resource is None:
+        return None
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class StageRecorder:
+    """ Seconds and memory of each stage of a run. Peak and retained
+    bytes are only known when tracing allocations, which slows down
+    every stage. """
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.stages = []
+
+    def start(self):
+        if self.memory:
+            tracemalloc.start()
+        return self
+
+    def stop(self):
+        if self.memory:
+            tracemalloc.stop()
+
+    def stage(self, name):
+        return Stage(self, name)
+
+    def total(self):
+        return sum(stage["seconds"] for stage in self.stages)
+
+
+class Stage:
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        if self.recorder.memory:
+            tracemalloc.reset_peak()
+            self.before = tracemalloc.get_traced_memory()[0]
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = perf_counter() - self.start
+        peak = retained = None
+        if self.recorder.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            retained = current - self.before
+        self.recorder.stages.append({
+            "stage": self.name,
+            "seconds": seconds,
+            "peak_bytes": peak,
+            "retained_bytes": retained,
+            "maxrss_bytes": maxrss(),
+        })
+
+
+def run_stages(db, recorder, loader="python", **options):
+    """ The pipeline of build_dbinfo and the /api/graph serialization,
+    one recorded stage each. Returns the DbInfo and the payload size. """
+    args = SimpleNamespace(**dict(DEFAULT_OPTIONS, **options))
+    with recorder.stage("load"):
+        localdb = LOADERS[loader](db)
+    dbinfo = DbInfo(db, localdb)
+    with recorder.stage("find_all"):
+        dbinfo.find_all(args.showallvdeps)
+    with recorder.stage("find_circles"):
+        dbinfo.find_circles()
+    with recorder.stage("topology_sort"):
+        dbinfo.topology_sort(args.usemagic, args.aligntop, args.mergerepos)
+    with recorder.stage("calcSizes"):
+        dbinfo.calcSizes()
+    if args.serverlayout:
+        with recorder.stage("layout"):
+            compute_layout(dbinfo)
+    with recorder.stage("render"):
+        payload = sum(len(line) for line in iter_graph_lines(dbinfo, args))
+    return dbinfo, payload
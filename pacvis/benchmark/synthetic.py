@@ -0,0 +1,126 @@
+import os
+import random
+import sqlite3
+
+SQL_CREATE_TABLES = """
+CREATE TABLE packages (
+  name TEXT PRIMARY KEY,
+  category TEXT,
+  section TEXT,
+  version TEXT,
+  release TEXT,
+  description TEXT
+);
+CREATE TABLE package_dependencies (
+  package TEXT,
+  dependency TEXT,
+  version TEXT,
+  relationship TEXT
+);
+CREATE TABLE package_sizes (
+  package TEXT PRIMARY KEY,
+  installed_size INTEGER
+);
+"""
+
+
+def make_synthetic_db(path, npkgs, avgdeps=4, provides=0.05, cycles=0,
+                      bases=0, basesize=20, optdeps=0.1, seed=0, hub=0):
+    """ Write an abbs.db with the schema SQL_GET_ALL_PKGS expects.
+
+    Packages depend on packages with a smaller index, on average
+    `avgdeps` of them, `optdeps` of those as recommends. About `provides`
+    of the packages provide a virtual name, and as many dependencies
+    point at those virtual names. `cycles` rings of 2 to 5 neighbouring
+    packages form dependency circles, and `bases` packages of the
+    'bases' section each pull `basesize` packages into their group.
+    The first `hub` packages all provide vdep-hub, twice, and as many
+    others depend on it, twice too: once as is and once with a version
+    none of them provides. """
+    rand = random.Random(seed)
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.executescript(SQL_CREATE_TABLES)
+    names = ["pkg%d" % i for i in range(npkgs)]
+    nvdeps = max(1, int(npkgs * provides))
+    pkgrows = []
+    deprows = []
+    sizerows = []
+    for i, name in enumerate(names):
+        pkgrows.append((name, "base", rand.choice(("libs", "utils", "devel")),
+                        "%d.%d" % (i % 7, i), str(i % 3) if i % 2 else None,
+                        "synthetic package %d" % i))
+        # long tailed like real installed sizes
+        sizerows.append((name, int(rand.lognormvariate(14, 2))))
+        if rand.random() < provides:
+            deprows.append((name, "vdep%d" % rand.randrange(nvdeps),
+                            "", "PKGREP"))
+        if i == 0:
+            continue
+        for _ in range(rand.randint(0, 2 * avgdeps)):
+            if rand.random() < provides:
+                dep = "vdep%d" % rand.randrange(nvdeps)
+            else:
+                dep = names[rand.randrange(i)]
+            relationship = "PKGRECOM" if rand.random() < optdeps else "PKGDEP"
+            deprows.append((name, dep, "", relationship))
+    for _ in range(cycles if npkgs > 1 else 0):
+        length = rand.randint(2, min(5, npkgs))
+        first = rand.randrange(npkgs - length + 1)
+        ring = names[first:first + length]
+        for pkg, dep in zip(ring, ring[1:] + ring[:1]):
+            deprows.append((pkg, dep, "", "PKGDEP"))
+    hub = min(hub, npkgs)
+    for i in range(hub):
+        deprows.append((names[i], "vdep-hub", "", "PKGREP"))
+        deprows.append((names[i], "vdep-hub=1", "", "PKGREP"))
+        dependent = names[npkgs - 1 - i]
+        deprows.append((dependent, "vdep-hub", "", "PKGDEP"))
+        deprows.append((dependent, "vdep-hub>=2", "", "PKGDEP"))
+    for i in range(bases):
+        name = "base-%d" % i
+        pkgrows.append((name, "base", "bases", "1", None,
+                        "synthetic group %d" % i))
+        for dep in rand.sample(names, min(basesize, npkgs)):
+            deprows.append((name, dep, "", "PKGDEP"))
+    conn.executemany("INSERT INTO packages VALUES (?, ?, ?, ?, ?, ?)",
+                     pkgrows)
+    conn.executemany("INSERT INTO package_dependencies VALUES (?, ?, ?, ?)",
+                     deprows)
+    conn.executemany("INSERT INTO package_sizes VALUES (?, ?)", sizerows)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def make_synthetic_graph(nnodes, avgdeps=4, cycles=100, seed=0):
+    """ Adjacency lists of a dependency graph with a chain as deep as the
+    graph itself and `cycles` back edges closing dependency circles. """
+    rand = random.Random(seed)
+    adj = [[i - 1] if i else [] for i in range(nnodes)]
+    for i in range(1, nnodes):
+        adj[i].extend(rand.randrange(i)
+                      for _ in range(rand.randint(0, 2 * avgdeps - 1)))
+    for _ in range(cycles):
+        i = rand.randrange(nnodes)
+        adj[i].append(rand.randrange(i, min(nnodes, i + 8)))
+    return adj
+
+
+def make_versions(nversions, seed=0):
+    """ AOSC style [epoch:]upstream[-release] versions, with pre-release
+    ~ suffixes and letters, many of them repeated like in a real db. """
+    rand = random.Random(seed)
+    suffixes = ("", "", "", "~rc1", "~beta2", "a", "+git20200101", "p1")
+    versions = []
+    for _ in range(nversions):
+        version = ".".join(str(rand.randrange(20))
+                           for _ in range(rand.randint(1, 4)))
+        version += rand.choice(suffixes)
+        if rand.random() < 0.05:
+            version = "%d:%s" % (rand.randint(1, 3), version)
+        if rand.random() < 0.5:
+            version += "-%d" % rand.randint(0, 5)
+        versions.append(version)
+    return versions
@@ -0,0 +1,177 @@
+import os
+import asyncio
+import threading
+import collections
+from time import perf_counter
+
+from .console import start_message, append_message, print_message
+from . import snapshot
+from . import metrics
+from .infos import DbInfo
+from .layout import compute_layout
+
+# options that change the built graph, everything else is only a view filter
+GRAPH_OPTIONS = ('showallvdeps', 'usemagic', 'aligntop', 'mergerepos',
+                 'serverlayout')
+
+# rough cost of the name, Package tuple and strings behind each node,
+# on top of the graph arrays, used for the memory budget
+APPROX_NODE_BYTES = 768
+
+
+def build_dbinfo(db, showallvdeps, usemagic, aligntop, mergerepos,
+                 serverlayout=False, loader="python"):
+    dbinfo = DbInfo(db, loader=loader)
+    start_message("Loading local database ...")
+    with dbinfo.timing("find_all"):
+        dbinfo.find_all(showallvdeps)
+    append_message("done")
+    start_message("Finding all dependency circles ... ")
+    with dbinfo.timing("find_circles"):
+        dbinfo.find_circles()
+    append_message("done")
+    dbinfo.topology_sort(usemagic, aligntop, mergerepos)
+    with dbinfo.timing("calcSizes"):
+        dbinfo.calcSizes()
+    if serverlayout:
+        with dbinfo.timing("layout"):
+            compute_layout(dbinfo)
+    return dbinfo
+
+
+def estimate_size(dbinfo):
+    size = dbinfo.graph.nbytes() + len(dbinfo.graph) * APPROX_NODE_BYTES
+    if dbinfo.layout is not None:
+        size += sum(coords.nbytes for coords in dbinfo.layout)
+    return size
+
+
+class GraphCache:
+    def __init__(self, maxentries=8, maxbytes=512 * 1024 * 1024,
+                 snapshots=True, loader="python"):
+        self.maxentries = maxentries
+        self.maxbytes = maxbytes
+        # read and write snapshots next to the databases
+        self.snapshots = snapshots
+        # key of infos.LOADERS, both build the same graph
+        self.loader = loader
+        self.entries = collections.OrderedDict()
+        self.totalbytes = 0
+        self.hits = 0
+        self.misses = 0
+        # requests that waited for a build already in flight
+        self.coalesced = 0
+        # key -> future of the build in flight
+        self.pending = {}
+        # (path, mtime, size) -> checksum, for the latest version of a db
+        self.digests = {}
+        self.digests_lock = threading.Lock()
+
+    def key(self, db, options):
+        path = os.path.abspath(db)
+        st = os.stat(path)
+        return ((path, st.st_mtime_ns, st.st_size) +
+                tuple(bool(getattr(options, opt)) for opt in GRAPH_OPTIONS))
+
+    def digest(self, key):
+        """ checksum of the db version in `key`, hashed once """
+        version = key[:3]
+        digest = self.digests.get(version)
+        if digest is None:
+            digest = snapshot.checksum(version[0])
+            with self.digests_lock:
+                for old in [v for v in self.digests if v[0] == version[0]]:
+                    del self.digests[old]
+                self.digests[version] = digest
+        return digest
+
+    def lookup(self, key):
+        if key not in self.entries:
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        print_message("Graph cache hit for %s" % key[0])
+        return self.entries[key][0]
+
+    def get(self, db, options):
+        key = self.key(db, options)
+        dbinfo = self.lookup(key)
+        if dbinfo is None:
+            self.misses += 1
+            dbinfo = self.load(db, key)
+            self.put(key, dbinfo)
+        return dbinfo
+
+    async def get_async(self, db, options, executor=None):
+        """ get() with the build running in `executor`. Concurrent calls
+        for the same key wait for the same build. The entries are only
+        touched from the calling (IOLoop) thread. """
+        key = self.key(db, options)
+        dbinfo = self.lookup(key)
+        if dbinfo is not None:
+            return dbinfo
+        future = self.pending.get(key)
+        if future is None:
+            self.misses += 1
+            future = asyncio.ensure_future(
+                asyncio.get_running_loop().run_in_executor(
+                    executor, self.load, db, key))
+            self.pending[key] = future
+            future.add_done_callback(lambda done: self.finish(key, done))
+        else:
+            self.coalesced += 1
+            print_message("Waiting for the graph of %s in flight" % key[0])
+        # a cancelled request must not cancel the build for the others
+        return await asyncio.shield(future)
+
+    def finish(self, key, future):
+        del self.pending[key]
+        if not future.cancelled() and future.exception() is None:
+            self.put(key, future.result())
+
+    def load(self, db, key):
+        """ Read the snapshot for `key` or build the graph, without
+        touching the cache entries. """
+        dbinfo = None
+        if self.snapshots:
+            start = perf_counter()
+            digest = self.digest(key)
+            path = snapshot.snapshot_path(db, key[3:])
+            dbinfo = snapshot.read_snapshot(db, path, digest)
+        if dbinfo is not None:
+            dbinfo.timings["snapshot"] = perf_counter() - start
+            metrics.record_dbinfo(dbinfo, "snapshot")
+            return dbinfo
+        dbinfo = build_dbinfo(db, *key[3:], loader=self.loader)
+        if self.snapshots:
+            try:
+                with dbinfo.timing("write_snapshot"):
+                    snapshot.write_snapshot(dbinfo, path, digest, key[3:])
+            except OSError as e:
+                print_message("Cannot write snapshot %s: %s" % (path, e))
+        metrics.record_dbinfo(dbinfo, "build")
+        return dbinfo
+
+    def put(self, key, dbinfo):
+        # entries built from an older version of the same db are stale
+        for old in [k for k in self.entries if k[0] == key[0] and
+                    k[1:3] != key[1:3]]:
+            self.evict(old)
+        size = estimate_size(dbinfo)
+        self.entries[key] = (dbinfo, size)
+        self.totalbytes += size
+        while len(self.entries) > 1 and (
+                len(self.entries) > self.maxentries or
+                self.totalbytes > self.maxbytes):
+            self.evict(next(iter(self.entries)))
+
+    def evict(self, key):
+        dbinfo, size = self.entries.pop(key)
+        self.totalbytes -= size
+        # packages shared with no other db leave the pool
+        dbinfo.localdb.release()
+
+    def clear(self):
+        for key in list(self.entries):
+            self.evict(key)
+
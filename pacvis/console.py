@@ -1,50 +1,96 @@
 import sys
-import os
+import logging
+import logging.handlers
 
-from time import gmtime, strftime
+from time import gmtime, perf_counter
+
+logger = logging.getLogger("pacvis")
 
 last_message = u""
 head_message = u""
+# what the progress line shows now
+painted = u""
 
-output_log, time_format = "/dev/null", "%Y-%m-%d %H:%M:%S"
+time_format = "%Y-%m-%d %H:%M:%S"
 last_line_ended = True
 
+# progress repaints per second, messages in between are dropped
+PROGRESS_RATE = 10
+progress_interval = 1.0 / PROGRESS_RATE
+last_paint = 0.0
+# last_message was not painted yet
+pending = False
+# no progress or messages on stderr, only the log
+quiet = False
+
+# records buffered before the log file is written, anything at INFO or
+# above flushes the buffer
+LOG_BUFFER = 256
+
+
+def configure(quiet_mode=False, logfile=None, level="INFO",
+              rate=PROGRESS_RATE):
+    """ Set up the progress line and the stdlib logging of pacvis. """
+    global quiet, progress_interval
+    quiet = quiet_mode
+    progress_interval = 1.0 / rate if rate > 0 else 0.0
+    root = logging.getLogger()
+    root.setLevel(level.upper())
+    if logfile:
+        target = logging.FileHandler(logfile)
+        formatter = logging.Formatter("%(asctime)s: %(message)s", time_format)
+        formatter.converter = gmtime
+        target.setFormatter(formatter)
+        root.addHandler(logging.handlers.MemoryHandler(
+            LOG_BUFFER, flushLevel=logging.INFO, target=target))
+
 
-def log_file():
-    return open(output_log, "a")
+def paint():
+    global last_paint, pending, last_line_ended, painted
+    last_paint = perf_counter()
+    pending = False
+    logger.debug(last_message)
+    if quiet:
+        return
+    if last_line_ended:
+        sys.stderr.write(last_message)
+    else:
+        sys.stderr.write("\r" + (" " * len(painted)) + "\r" + last_message)
+    sys.stderr.flush()
+    painted = last_message
+    last_line_ended = False
+
+
+def end_line():
+    global last_line_ended
+    if pending:
+        paint()
+    if not last_line_ended and not quiet:
+        sys.stderr.write("\n")
+    last_line_ended = True
 
 
 def start_message(s):
-    global last_message, head_message, last_line_ended
+    global last_message, head_message
+    end_line()
     head_message = s
     last_message = s
-    if not last_line_ended:
-        sys.stderr.write("\n")
-    sys.stderr.write(s)
-    sys.stderr.flush()
-    last_line_ended = False
+    paint()
 
 
 def append_message(s):
-    global last_message, head_message, log_file, last_line_ended
-
-    sys.stderr.write("\r" + (" " * len(last_message)))
+    global last_message, pending
     last_message = head_message + s
-    sys.stderr.write("\r" + last_message)
-    sys.stderr.flush()
-    with log_file() as log:
-        log.write("%s: %s\n" % (strftime(time_format, gmtime()), last_message))
-        log.flush()
-    last_line_ended = False
+    pending = True
+    if perf_counter() - last_paint >= progress_interval:
+        paint()
 
 
 def print_message(s):
     global last_line_ended
-    if not last_line_ended:
-        sys.stderr.write("\n")
-    sys.stderr.write(s + "\n")
-    sys.stderr.flush()
-    with log_file() as log:
-        log.write("%s: %s\n" % (strftime(time_format, gmtime()), s))
-        log.flush()
+    end_line()
+    logger.info(s)
+    if not quiet:
+        sys.stderr.write(s + "\n")
+        sys.stderr.flush()
     last_line_ended = True
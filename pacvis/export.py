@@ -0,0 +1,121 @@
+import os
+import re
+import json
+import base64
+import sqlite3
+from types import SimpleNamespace
+from concurrent.futures import ProcessPoolExecutor
+
+from .console import print_message
+from .cache import GraphCache
+from .render import graph_data, DEFAULT_OPTIONS
+
+PACKAGE_DIR = os.path.dirname(__file__)
+STATIC_DIR = os.path.join(PACKAGE_DIR, "static")
+TEMPLATE_DIR = os.path.join(PACKAGE_DIR, "templates")
+# linked from the page head, inlined into exported pages
+ASSETS = ("vis-network.min.js", "vis.min.css",
+          "material.deep_purple-amber.min.css", "material.min.js",
+          "animate.css", "pacvis.js", "pacvis.css")
+# the icon font is the only file the stylesheets need
+RE_font = re.compile(r'url\((MaterialIcons-Regular\.woff2)\)')
+
+FORMATS = {"json": ".json", "html": ".html"}
+
+
+def read_assets():
+    assets = {}
+    for name in ASSETS:
+        with open(os.path.join(STATIC_DIR, name), encoding="utf-8") as f:
+            assets[name] = f.read().replace("</script", "<\\/script")
+    with open(os.path.join(STATIC_DIR, "MaterialIcons-Regular.woff2"),
+              "rb") as f:
+        font = "url(data:font/woff2;base64,%s)" % base64.b64encode(
+            f.read()).decode()
+    assets["pacvis.css"] = RE_font.sub(font, assets["pacvis.css"])
+    return assets
+
+
+def render_html(data, args):
+    """ self-contained page with the graph and the static files inlined """
+    import tornado.template
+    loader = tornado.template.Loader(TEMPLATE_DIR)
+    # "</" cannot end the embedding script element once escaped
+    graphjson = json.dumps(data).replace("</", "<\\/")
+    return loader.load("index.template.html").generate(
+        options=args,
+        optionsjson=json.dumps(args.__dict__),
+        dbs=(),
+        db=None,
+        assets=read_assets(),
+        graphjson=graphjson)
+
+
+def output_name(db):
+    """ abbs.db -> abbs, stable/abbs.db -> stable_abbs """
+    name = os.path.splitext(os.path.normpath(db))[0]
+    return name.strip(os.sep + ".").replace(os.sep, "_") or "abbs"
+
+
+def export_db(db, outdir, fmt, options, snapshots=True, loader="python"):
+    args = SimpleNamespace(**options)
+    dbinfo = GraphCache(maxentries=1, snapshots=snapshots,
+                        loader=loader).get(db, args)
+    for name in (args.pkg, args.pathto):
+        if name and name not in dbinfo.all_pkgs:
+            raise KeyError("no package %s in %s" % (name, db))
+    data = graph_data(dbinfo, args)
+    path = os.path.join(outdir, output_name(db) + FORMATS[fmt])
+    if fmt == "html":
+        with open(path, "wb") as f:
+            f.write(render_html(data, args))
+    else:
+        with open(path, "w") as f:
+            json.dump(data, f)
+    return path
+
+
+def add_arguments(parser):
+    parser.add_argument("dbs", nargs="+", metavar="db",
+                        help="abbs.db files to export")
+    parser.add_argument("-o", "--output", default=".",
+                        help="directory to write the files to")
+    parser.add_argument("-f", "--format", choices=sorted(FORMATS),
+                        default="json")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="databases processed in parallel")
+    parser.add_argument("--no-snapshot", action="store_true",
+                        help="neither read nor write graph snapshots")
+    options = parser.add_argument_group("graph options")
+    for key, value in DEFAULT_OPTIONS.items():
+        if type(value) is bool:
+            options.add_argument("--" + key, action="store_true")
+        else:
+            options.add_argument("--" + key, type=type(value), default=value)
+
+
+def run(args):
+    options = {key: getattr(args, key) for key in DEFAULT_OPTIONS}
+    os.makedirs(args.output, exist_ok=True)
+    jobs = [(db, args.output, args.format, options, not args.no_snapshot,
+             args.loader) for db in args.dbs]
+    failed = 0
+    if len(jobs) == 1 or args.jobs <= 1:
+        results = [run_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(min(args.jobs, len(jobs))) as pool:
+            results = list(pool.map(run_job, jobs))
+    for db, (path, error) in zip(args.dbs, results):
+        if error is None:
+            print_message("Exported %s to %s" % (db, path))
+        else:
+            failed += 1
+            print_message("Failed to export %s: %s" % (db, error))
+    return 1 if failed else 0
+
+
+def run_job(job):
+    try:
+        return export_db(*job), None
+    except (OSError, KeyError, ValueError, sqlite3.Error) as e:
+        return None, str(e)
@@ -0,0 +1,383 @@
+import itertools
+import collections
+from array import array
+
+
+class Condensation:
+    """ DAG of strongly connected components.
+
+    `components` are in the order Tarjan's algorithm emits them, so every
+    component comes after all components it depends on. `edges[c]` are the
+    components that component `c` depends on, without duplicates. """
+
+    def __init__(self, components, component_of, edges):
+        self.components = components
+        self.component_of = component_of
+        self.edges = edges
+        # see dependents()
+        self.reverse = None
+
+    def __len__(self):
+        return len(self.components)
+
+    def members(self, node):
+        return self.components[self.component_of[node]]
+
+    def dependents(self):
+        """ `dependents()[c]` are the components depending on component
+        `c`, built on first use """
+        if self.reverse is None:
+            reverse = [[] for _ in range(len(self.components))]
+            for cid, targets in enumerate(self.edges):
+                for target in targets:
+                    reverse[target].append(cid)
+            self.reverse = reverse
+        return self.reverse
+
+
+def strongly_connected_components(nodes, successors):
+    """ Iterative Tarjan, emitting components in the same order and with
+    members in the same order as the recursive formulation.
+
+    https://zh.wikipedia.org/wiki/Tarjan%E7%AE%97%E6%B3%95 """
+    index = {}
+    lowlink = {}
+    onstack = set()
+    stack = []
+    components = []
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        onstack.add(root)
+        work = [(root, iter(successors(root)))]
+        while work:
+            node, succs = work[-1]
+            for succ in succs:
+                if succ not in index:
+                    index[succ] = lowlink[succ] = len(index)
+                    stack.append(succ)
+                    onstack.add(succ)
+                    work.append((succ, iter(successors(succ))))
+                    break
+                elif succ in onstack and index[succ] < lowlink[node]:
+                    lowlink[node] = index[succ]
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    if lowlink[node] < lowlink[parent]:
+                        lowlink[parent] = lowlink[node]
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        onstack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+    return components
+
+
+def condense(nodes, successors):
+    components = strongly_connected_components(nodes, successors)
+    component_of = {}
+    for cid, component in enumerate(components):
+        for node in component:
+            component_of[node] = cid
+    return Condensation(components, component_of,
+                        component_edges(components, component_of,
+                                        successors))
+
+
+def component_edges(components, component_of, successors):
+    edges = []
+    for cid, component in enumerate(components):
+        targets = {}
+        for node in component:
+            for succ in successors(node):
+                target = component_of[succ]
+                if target != cid:
+                    targets[target] = None
+        edges.append(list(targets))
+    return edges
+
+
+def breadth_first(starts, successors, maxdepth=-1):
+    """ Depth of every node reachable from `starts` in at most `maxdepth`
+    steps, or in any number of steps if `maxdepth` is negative. """
+    depths = {node: 0 for node in starts}
+    frontier = list(depths)
+    depth = 0
+    while frontier and depth != maxdepth:
+        depth += 1
+        following = []
+        for node in frontier:
+            for succ in successors(node):
+                if succ not in depths:
+                    depths[succ] = depth
+                    following.append(succ)
+        frontier = following
+    return depths
+
+
+def shortest_path(start, goal, successors):
+    """ Nodes of a shortest path from `start` to `goal`, or None. """
+    parents = {start: None}
+    queue = collections.deque([start])
+    while queue:
+        node = queue.popleft()
+        if node == goal:
+            path = []
+            while node is not None:
+                path.append(node)
+                node = parents[node]
+            return path[::-1]
+        for succ in successors(node):
+            if succ not in parents:
+                parents[succ] = node
+                queue.append(succ)
+    return None
+
+
+def bitset(bits, nbits):
+    """ int with the given bit positions set """
+    buf = bytearray((nbits + 7) // 8)
+    for bit in bits:
+        buf[bit >> 3] |= 1 << (bit & 7)
+    return int.from_bytes(buf, "little")
+
+
+def closure_sizes(condensation, weights):
+    """ Sum of `weights[c]` over each component c and every component it
+    depends on, directly or not.
+
+    The reachable set of a component is a bitset (an int with bit c for
+    component c), the union of those of its dependencies, built in
+    condensation order and dropped once its last dependent is done. The
+    weighted popcount is taken one bit of the weights at a time. """
+    ncomp = len(condensation)
+    edges = condensation.edges
+    slices = [bitset((cid for cid, weight in enumerate(weights)
+                      if weight >> shift & 1), ncomp)
+              for shift in range(max(weights, default=0).bit_length())]
+    waiting = [0] * ncomp
+    for targets in edges:
+        for target in targets:
+            waiting[target] += 1
+    closures = [0] * ncomp
+    sizes = [0] * ncomp
+    for cid in range(ncomp):
+        closure = 1 << cid
+        for target in edges[cid]:
+            closure |= closures[target]
+            waiting[target] -= 1
+            if waiting[target] == 0:
+                closures[target] = 0
+        if waiting[cid]:
+            closures[cid] = closure
+        sizes[cid] = sum((closure & mask).bit_count() << shift
+                         for shift, mask in enumerate(slices))
+    return sizes
+
+
+def dominator_sizes(condensation, weights):
+    """ Sum of `weights[c]` over each component c and every component
+    only reachable through it, i.e. over its subtree in the dominator
+    tree. The tree is rooted above all components nothing depends on.
+
+    Dependents come after their dependencies in the condensation, so
+    walking it backwards visits every component after all of its
+    dependents and one pass of Cooper, Harvey and Kennedy's intersection
+    finds each immediate dominator. """
+    ncomp = len(condensation)
+    root = ncomp
+    dependents = [[] for _ in range(ncomp)]
+    for cid, targets in enumerate(condensation.edges):
+        for target in targets:
+            dependents[target].append(cid)
+    # every dominator has a larger id than the components it dominates
+    idom = [root] * (ncomp + 1)
+    for cid in range(ncomp - 1, -1, -1):
+        preds = dependents[cid]
+        if not preds:
+            continue
+        dom = preds[0]
+        for pred in preds[1:]:
+            while dom != pred:
+                if dom < pred:
+                    dom = idom[dom]
+                else:
+                    pred = idom[pred]
+        idom[cid] = dom
+    sizes = list(weights) + [0]
+    for cid in range(ncomp):
+        sizes[idom[cid]] += sizes[cid]
+    return sizes[:ncomp]
+
+
+# node kinds
+PACKAGE = 0
+GROUP = 1
+VDEP = 2
+
+
+def compress(nnodes, sources, targets):
+    """ CSR (compressed sparse row) adjacency of the edges (sources[i],
+    targets[i]). The edges of one node keep their relative order. """
+    counts = [0] * (nnodes + 1)
+    for src in sources:
+        counts[src + 1] += 1
+    for node in range(nnodes):
+        counts[node + 1] += counts[node]
+    offsets = array('i', counts)
+    adjacency = array('i', bytes(offsets.itemsize * len(sources)))
+    fill = counts[:-1]
+    for src, dst in zip(sources, targets):
+        adjacency[fill[src]] = dst
+        fill[src] += 1
+    return offsets, adjacency
+
+
+class PackageGraph:
+    """ Compact dependency graph.
+
+    Nodes are integer ids indexing `names`, `kinds`, `packages` and the
+    per-node attribute arrays. Depends, required-by and optional depends
+    are CSR arrays: the neighbours of `node` are
+    `targets[offsets[node]:offsets[node + 1]]`. """
+
+    # per node and edge arrays, in the order of arrays()
+    ARRAYS = ('kinds', 'dep_offsets', 'dep_targets', 'req_offsets',
+              'req_targets', 'opt_offsets', 'opt_targets', 'level', 'isize',
+              'csize', 'cssize')
+
+    def __init__(self, names, kinds, packages, deps, optdeps):
+        nnodes = len(names)
+        self.names = names
+        self.index = {name: node for node, name in enumerate(names)}
+        self.kinds = kinds
+        self.packages = packages
+        self.dep_offsets, self.dep_targets = compress(nnodes, *deps)
+        self.req_offsets, self.req_targets = compress(nnodes, deps[1],
+                                                      deps[0])
+        self.opt_offsets, self.opt_targets = compress(nnodes, *optdeps)
+        self.level = array('i', [1]) * nnodes
+        self.isize = array('q', [0]) * nnodes
+        self.csize = array('q', [0]) * nnodes
+        self.cssize = array('q', [0]) * nnodes
+
+    def __len__(self):
+        return len(self.names)
+
+    def deps(self, node):
+        return self.dep_targets[self.dep_offsets[node]:
+                                self.dep_offsets[node + 1]]
+
+    def requiredby(self, node):
+        return self.req_targets[self.req_offsets[node]:
+                                self.req_offsets[node + 1]]
+
+    def optdeps(self, node):
+        return self.opt_targets[self.opt_offsets[node]:
+                                self.opt_offsets[node + 1]]
+
+    def ndeps(self, node):
+        return self.dep_offsets[node + 1] - self.dep_offsets[node]
+
+    def nreqs(self, node):
+        return self.req_offsets[node + 1] - self.req_offsets[node]
+
+    @classmethod
+    def from_arrays(cls, names, packages, arrays):
+        """ Graph over existing arrays, e.g. views of a snapshot """
+        graph = cls.__new__(cls)
+        graph.names = names
+        graph.index = {name: node for node, name in enumerate(names)}
+        graph.packages = packages
+        for name, values in zip(cls.ARRAYS, arrays):
+            setattr(graph, name, values)
+        return graph
+
+    def arrays(self):
+        return tuple(getattr(self, name) for name in self.ARRAYS)
+
+    def nbytes(self):
+        return sum(a.itemsize * len(a) for a in self.arrays())
+
+
+class GraphBuilder:
+    """ Collects nodes and edges into flat buffers for a PackageGraph. """
+
+    def __init__(self):
+        self.names = []
+        self.index = {}
+        self.kinds = array('b')
+        self.packages = []
+        self.deps = (array('i'), array('i'))
+        self.optdeps = (array('i'), array('i'))
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def node(self, name, kind, package=None):
+        node = self.index.get(name)
+        if node is None:
+            node = len(self.names)
+            self.index[name] = node
+            self.names.append(name)
+            self.kinds.append(kind)
+            self.packages.append(package)
+        return node
+
+    def add_dep(self, src, dst):
+        self.deps[0].append(src)
+        self.deps[1].append(dst)
+
+    def add_optdep(self, src, dst):
+        self.optdeps[0].append(src)
+        self.optdeps[1].append(dst)
+
+    def extend_deps(self, sources, targets):
+        self.deps[0].extend(sources)
+        self.deps[1].extend(targets)
+
+    def extend_optdeps(self, sources, targets):
+        self.optdeps[0].extend(sources)
+        self.optdeps[1].extend(targets)
+
+    def has_requiredby(self):
+        result = bytearray(len(self.names))
+        for dst in self.deps[1]:
+            result[dst] = 1
+        return result
+
+    def build(self, removed=()):
+        """ Freeze into a PackageGraph without the `removed` nodes and
+        their edges, in one pass over the buffers. Edges added more than
+        once, e.g. through "foo" and "foo>=1", are kept once, where they
+        were first added. """
+        remap = array('i', range(len(self.names)))
+        names, kinds, packages = [], array('b'), []
+        for node, name in enumerate(self.names):
+            if node in removed:
+                remap[node] = -1
+                continue
+            remap[node] = len(names)
+            names.append(name)
+            kinds.append(self.kinds[node])
+            packages.append(self.packages[node])
+
+        def edges(buffers):
+            # an insertion ordered set of the (source, target) pairs
+            pairs = dict.fromkeys(zip(map(remap.__getitem__, buffers[0]),
+                                      map(remap.__getitem__, buffers[1])))
+            if removed:
+                pairs = (pair for pair in pairs if -1 not in pair)
+            flat = array('i', itertools.chain.from_iterable(pairs))
+            return flat[0::2], flat[1::2]
+
+        return PackageGraph(names, kinds, packages,
+                            edges(self.deps), edges(self.optdeps))
@@ -0,0 +1,112 @@
+import json
+import sqlite3
+from time import perf_counter
+from types import SimpleNamespace
+
+from .cache import GraphCache, GRAPH_OPTIONS
+from .console import print_message
+from .graph import PACKAGE
+from .render import DEFAULT_OPTIONS
+
+
+def affected_components(condensation, seeds):
+    """ The components of the nodes `seeds` and every component depending
+    on them, directly or not, as a bytearray with 1 for each. """
+    dependents = condensation.dependents()
+    affected = bytearray(len(condensation))
+    frontier = []
+    for node in seeds:
+        cid = condensation.component_of[node]
+        if not affected[cid]:
+            affected[cid] = 1
+            frontier.append(cid)
+    while frontier:
+        following = []
+        for cid in frontier:
+            for dependent in dependents[cid]:
+                if not affected[dependent]:
+                    affected[dependent] = 1
+                    following.append(dependent)
+        frontier = following
+    return affected
+
+
+def rebuild_waves(dbinfo, names):
+    """ Packages to rebuild when the packages `names` change, the changed
+    ones included, as lists of names. The packages of a list only depend
+    on those of earlier lists, so each can be built in parallel.
+
+    Waves follow the levels of topology_sort, which are higher for
+    dependents than for their dependencies and shared by a circle. """
+    graph = dbinfo.graph
+    condensation = dbinfo.condensation
+    affected = affected_components(condensation,
+                                   [graph.index[name] for name in names])
+    waves = {}
+    for cid, component in enumerate(condensation.components):
+        if affected[cid]:
+            packages = [graph.names[node] for node in component
+                        if graph.kinds[node] == PACKAGE]
+            if packages:
+                level = graph.level[component[0]]
+                waves.setdefault(level, []).extend(packages)
+    return [sorted(waves[level]) for level in sorted(waves)]
+
+
+def impact_data(dbinfo, names):
+    """ the /api/impact and `pacvis impact --json` result """
+    start = perf_counter()
+    waves = rebuild_waves(dbinfo, names)
+    return {
+        "changed": names,
+        "waves": waves,
+        "packages": sum(map(len, waves)),
+        "seconds": perf_counter() - start,
+    }
+
+
+def split_packages(values):
+    """ package names from arguments that may each be comma separated """
+    names = []
+    for value in values:
+        names.extend(name for name in value.split(",") if name)
+    return list(dict.fromkeys(names))
+
+
+def add_arguments(parser):
+    parser.add_argument("pkgs", nargs="+", metavar="pkg",
+                        help="changed packages")
+    parser.add_argument("--json", action="store_true",
+                        help="print the waves as JSON")
+    parser.add_argument("--no-snapshot", action="store_true",
+                        help="neither read nor write graph snapshots")
+    options = parser.add_argument_group("graph options")
+    for key in GRAPH_OPTIONS:
+        options.add_argument("--" + key, action="store_true")
+
+
+def run(args, dbs):
+    """ print the waves for the first of the databases `dbs` """
+    options = dict(DEFAULT_OPTIONS)
+    options.update((key, getattr(args, key)) for key in GRAPH_OPTIONS)
+    db = next(iter(dbs.values()))
+    try:
+        dbinfo = GraphCache(maxentries=1, snapshots=not args.no_snapshot,
+                            loader=args.loader).get(
+                                db, SimpleNamespace(**options))
+    except (OSError, sqlite3.Error) as e:
+        print_message("Cannot read %s: %s" % (db, e))
+        return 1
+    names = split_packages(args.pkgs)
+    missing = [name for name in names if name not in dbinfo.all_pkgs]
+    if missing:
+        print_message("No package %s in %s" % (", ".join(missing), db))
+        return 1
+    data = impact_data(dbinfo, names)
+    if args.json:
+        print(json.dumps(data, indent=2))
+        return 0
+    for i, wave in enumerate(data["waves"], 1):
+        print("wave %d: %s" % (i, " ".join(wave)))
+    print("%d packages in %d waves" % (data["packages"], len(data["waves"])))
+    return 0
@@ -1,13 +1,20 @@
-from itertools import groupby
 import math
 import re
 import collections
+import collections.abc
+import sys
 import sqlite3
 import operator
-
-from distutils.version import LooseVersion
+import functools
+import itertools
+import threading
+from array import array
+from time import perf_counter
 
 from .console import start_message, append_message, print_message
+from .graph import condense, closure_sizes, dominator_sizes
+from .graph import GraphBuilder, PACKAGE, GROUP, VDEP
+from .version import version_key
 
 SQL_GET_ALL_PKGS = """
 SELECT
@@ -49,6 +56,62 @@ LEFT JOIN (
 WHERE packages.section != 'bases'
 """
 
+# the rows behind SQL_GET_ALL_PKGS, without the group_concat
+SQL_GET_PACKAGES = """
+SELECT
+  name,
+  (category || '-' || section) AS section,
+  CASE
+    WHEN release IS NULL THEN version
+    ELSE (version || '-' || release)
+  END AS version,
+  description AS desc
+FROM packages
+WHERE packages.section != 'bases'
+"""
+
+SQL_GET_RELATIONS = """
+SELECT package, dependency, relationship
+FROM package_dependencies
+WHERE relationship IN ('PKGDEP', 'PKGRECOM')
+   OR (relationship = 'PKGREP' AND version = '')
+"""
+
+SQL_GET_BASES = """
+SELECT pkgdep.dependency, pkgdep.package
+FROM package_dependencies pkgdep
+JOIN packages ON pkgdep.package = packages.name
+WHERE packages.section = 'bases' AND pkgdep.relationship = 'PKGDEP'
+"""
+
+# index of the list in SqlAbbsDB.load
+RELATIONS = {'PKGREP': 0, 'PKGDEP': 1, 'PKGRECOM': 2}
+
+# graph nodes by name, the primary key is the index the joins probe
+SQL_CREATE_NODES = """
+CREATE TEMP TABLE pacvis_nodes (
+  name TEXT PRIMARY KEY,
+  node INTEGER NOT NULL,
+  package INTEGER NOT NULL
+) WITHOUT ROWID
+"""
+
+SQL_UNRESOLVED = """
+SELECT DISTINCT dependency
+FROM package_dependencies
+WHERE relationship IN ('PKGDEP', 'PKGRECOM')
+  AND dependency NOT IN (SELECT name FROM temp.pacvis_nodes)
+"""
+
+SQL_RESOLVE_EDGES = """
+SELECT src.node, dst.node
+FROM package_dependencies dep
+JOIN temp.pacvis_nodes src ON src.name = dep.package AND src.package
+JOIN temp.pacvis_nodes dst ON dst.name = dep.dependency
+WHERE dep.relationship = ?
+ORDER BY src.node, dep.rowid
+"""
+
 RE_dep = re.compile(r'^([a-z0-9][a-z0-9+.-]*)(.*)$')
 RE_comp = re.compile(r'([<>]=|<<|>>|[<=>])')
 DEP_OPERATORS = {
@@ -63,54 +126,257 @@ DEP_OPERATORS = {
 
 Package = collections.namedtuple('Package', (
     'name', 'section', 'version', 'groups',
-    'provides', 'depends', 'optdepends', 'desc'
+    'provides', 'depends', 'optdepends', 'desc', 'size'
 ))
 
+# optional sidecar table with installed sizes in bytes, without it every
+# package counts as size 1
+SQL_GET_PACKAGE_SIZES = """
+SELECT package, installed_size FROM package_sizes
+"""
+
+
+# version and dependency strings kept parsed, shared by all loaded databases
+# and bounded so that strings of evicted graphs do not stay forever
+PARSE_CACHE_SIZE = 1 << 16
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_version(version):
+    """ version_key, cached for the recently seen version strings of the
+    packages and constraints """
+    return version_key(version)
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def split_dependency(dep):
+    match = RE_dep.match(dep)
+    if match is None:
+        return dep, None, None
+    name, comp = match.groups()
+    comp = comp.strip()
+    if not comp:
+        return name, None, None
+    op = RE_comp.match(comp)
+    if op is None:
+        return name, None, None
+    return name, op.group(0), comp[len(op.group(0)):].strip()
+
+
+def version_satisfies(version, op, depver):
+    if not version:
+        return False
+    return DEP_OPERATORS[op](parse_version(version), parse_version(depver))
+
+
+def split_names(names):
+    return tuple(map(sys.intern, names.split(','))) if names else ()
+
+
+class PackagePool:
+    """ One Package tuple per distinct package, shared by the AbbsDBs of
+    all loaded databases, so that branches of the same repository mostly
+    share their packages. Each package is counted once per AbbsDB that
+    interned it, and forgotten once they all released it. Graphs are
+    built in executor threads while the IOLoop releases evicted ones, so
+    the counts are only touched under the lock. """
+
+    def __init__(self):
+        # package -> [pooled package, number of owners]
+        self.packages = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.packages)
+
+    def intern(self, pkg):
+        with self.lock:
+            entry = self.packages.get(pkg)
+            if entry is None:
+                entry = self.packages[pkg] = [pkg, 0]
+            entry[1] += 1
+            return entry[0]
+
+    def release(self, pkgs):
+        """ drop one owner of each of `pkgs` """
+        with self.lock:
+            for pkg in pkgs:
+                entry = self.packages[pkg]
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self.packages[pkg]
+
+
+package_pool = PackagePool()
+
+
 class AbbsDB:
-    def __init__(self, db):
+    def __init__(self, db, load=True):
         self.name = db
         self.packages = []
         self.package_dict = {}
-        self.load()
+        # provided name -> [(package, provided version or None)]
+        self.provides_index = {}
+        if load:
+            self.load()
+
+    def read_sizes(self, cur):
+        if cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                       "AND name = 'package_sizes'").fetchone():
+            return dict(cur.execute(SQL_GET_PACKAGE_SIZES))
+        return {}
 
     def load(self):
         conn = sqlite3.connect(self.name)
         cur = conn.cursor()
+        sizes = self.read_sizes(cur)
         for row in cur.execute(SQL_GET_ALL_PKGS):
             name, section, version, groups, provides, depends, optdepends, desc = row
+            # names repeat across thousands of dependency lists
             pkg = Package(
-                name, section, version,
-                groups.split(',') if groups else [],
-                provides.split(',') if provides else [],
-                depends.split(',') if depends else [],
-                optdepends.split(',') if optdepends else [],
-                desc
+                sys.intern(name), section, version,
+                split_names(groups),
+                split_names(provides),
+                split_names(depends),
+                split_names(optdepends),
+                desc,
+                sizes.get(name) or (0 if sizes else 1)
             )
-            self.packages.append(pkg)
-            self.package_dict[name] = pkg
+            self.add(pkg)
         conn.close()
 
+    def release(self):
+        """ hand the packages back to package_pool, once the DbInfo built
+        from this db is dropped """
+        package_pool.release(self.packages)
+        self.packages = []
+
+    def add(self, pkg):
+        pkg = package_pool.intern(pkg)
+        self.packages.append(pkg)
+        self.package_dict[pkg.name] = pkg
+        for provide in pkg.provides:
+            proname, proop, prover = split_dependency(provide)
+            self.provides_index.setdefault(proname, []).append(
+                (pkg, prover if proop == '=' and prover else None))
+        return pkg
+
     def find_satisfier(self, dep):
-        deppkgname, depcomp = RE_dep.match(dep).groups()
-        if depcomp:
-            depverop = RE_comp.match(s).group(0)
-            depver = depcomp[len(depverop):]
+        deppkgname, depverop, depver = split_dependency(dep)
         deppkg = self.package_dict.get(deppkgname)
-        if deppkg and (not depcomp or DEP_OPERATORS[depverop](
-            LooseVersion(deppkg.version), LooseVersion(depver))):
+        if deppkg and (depverop is None or version_satisfies(
+                deppkg.version, depverop, depver)):
             return deppkg
-        for pkg in self.packages:
-            if deppkgname in pkg.provides and not depcomp:
+        for pkg, version in self.provides_index.get(deppkgname, ()):
+            if depverop is None or version_satisfies(version, depverop, depver):
                 return pkg
 
+
+class SqlAbbsDB(AbbsDB):
+    """ AbbsDB that reads the dependency rows one by one instead of the
+    comma joined lists, and resolves the dependencies of all packages in
+    one query, see resolved_edges. """
+
+    def load(self):
+        conn = sqlite3.connect(self.name)
+        cur = conn.cursor()
+        sizes = self.read_sizes(cur)
+        # name -> (provides, depends, optdepends)
+        relations = {}
+        for package, dependency, relationship in cur.execute(
+                SQL_GET_RELATIONS):
+            lists = relations.get(package)
+            if lists is None:
+                lists = relations[package] = ([], [], [])
+            lists[RELATIONS[relationship]].append(sys.intern(dependency))
+        groups = {}
+        for package, group in cur.execute(SQL_GET_BASES):
+            groups.setdefault(package, []).append(sys.intern(group))
+        empty = ((), (), ())
+        for name, section, version, desc in cur.execute(SQL_GET_PACKAGES):
+            provides, depends, optdepends = relations.get(name, empty)
+            self.add(Package(
+                sys.intern(name), section, version,
+                tuple(groups.get(name, ())),
+                tuple(provides), tuple(depends), tuple(optdepends),
+                desc,
+                sizes.get(name) or (0 if sizes else 1)
+            ))
+        conn.close()
+
+    def resolved_edges(self, names, kinds, resolve):
+        """ (sources, targets) arrays of the depends and of the optdepends
+        of the packages among the nodes `names`, ordered by source like
+        adding them package by package would. Dependencies are matched
+        to node names in SQLite, `resolve` maps each remaining name to a
+        node or None. """
+        conn = sqlite3.connect(self.name)
+        try:
+            insert = "INSERT INTO temp.pacvis_nodes VALUES (?, ?, ?)"
+            conn.execute(SQL_CREATE_NODES)
+            conn.executemany(insert, zip(names, range(len(names)),
+                                         (kind == PACKAGE for kind in kinds)))
+            # e.g. versioned names, they become aliases of their nodes
+            aliases = []
+            for name, in conn.execute(SQL_UNRESOLVED).fetchall():
+                node = resolve(name)
+                if node is not None:
+                    aliases.append((name, node, False))
+            conn.executemany(insert, aliases)
+            result = []
+            for relationship in ('PKGDEP', 'PKGRECOM'):
+                pairs = array('i', itertools.chain.from_iterable(
+                    conn.execute(SQL_RESOLVE_EDGES, (relationship,))))
+                result.append((pairs[0::2], pairs[1::2]))
+            return result
+        finally:
+            conn.close()
+
+
+# AbbsDB classes by the name --loader selects them with
+LOADERS = {
+    "python": AbbsDB,
+    "sql": SqlAbbsDB,
+}
+
+
+class PhaseTimer:
+    def __init__(self, timings, phase):
+        self.timings = timings
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = perf_counter() - self.start
+        self.timings[self.phase] = self.timings.get(self.phase, 0) + elapsed
+
+
 class DbInfo:
-    def __init__(self, db='abbs.db'):
-        self.localdb = AbbsDB(db)
+    def __init__(self, db='abbs.db', localdb=None, loader="python"):
+        # phase name -> accumulated seconds
+        self.timings = {}
+        # work done by the phases, see metrics.DBINFO_COUNTERS
+        self.counters = collections.Counter()
+        if localdb is None:
+            with self.timing("load"):
+                localdb = LOADERS[loader](db)
+        self.localdb = localdb
         self.packages = self.localdb.packages
-        self.all_pkgs = {}
-        self.groups = {}
-        self.vdeps = {}
+        # dependency -> name of the package satisfying it, or None; the
+        # same dependencies repeat across thousands of packages
+        self.satisfiers = {}
+        self.graph = None
+        self.all_pkgs = NodeMap(self)
         self.repo = RepoInfo(db, self)
+        self.condensation = None
+        # (x, y) coordinate arrays, see layout.compute_layout
+        self.layout = None
+        # see search.search_index and analytics.graph_analytics
+        self.search_index = None
+        self.analytics = None
         print_message("Loading %s" % db)
 
     def find_syncdb(self, pkgname):
@@ -121,269 +387,357 @@ class DbInfo:
     def get(self, pkgname):
         return self.all_pkgs[pkgname]
 
-    def resolve_dependency(self, dep):
-        if dep in self.all_pkgs:
+    def view(self, node):
+        return VIEWS[self.graph.kinds[node]](self, node)
+
+    def resolve_dependency(self, dep, known=None):
+        self.counters["resolve_lookups"] += 1
+        if dep in (self.all_pkgs if known is None else known):
             return dep
-        pkg = self.localdb.find_satisfier(dep)
-        if pkg is None:
-            return None
-        return pkg.name
+        if dep not in self.satisfiers:
+            pkg = self.localdb.find_satisfier(dep)
+            self.satisfiers[dep] = None if pkg is None else pkg.name
+        return self.satisfiers[dep]
 
     def find_all(self, showallvdeps):
+        builder = GraphBuilder()
+        # each package followed by the vdeps and groups it brings up
+        # first, the order find_circles visits them and so picks the
+        # roots listing each circle by
         for pkg in self.packages:
-            PkgInfo(pkg.name, self)
-        for pkg in self.all_pkgs.values():
-            pkg.find_dependencies(self)
-        if showallvdeps:
-            return self.all_pkgs
-        # remove vdeps without requiredby
-        for pkg in list(self.all_pkgs.values()):
-            if type(pkg) is VDepInfo:
-                if len(pkg.requiredby) == 0:
-                    for dep in pkg.deps:
-                        while pkg.name in self.get(dep).requiredby:
-                            self.get(dep).requiredby.remove(pkg.name)
-                    self.repo.pkgs.remove(pkg.name)
-                    del self.all_pkgs[pkg.name]
-                    del self.vdeps[pkg.name]
+            node = builder.node(pkg.name, PACKAGE, pkg)
+            self.find_syncdb(pkg.name)
+            for provide in pkg.provides:
+                name = self.requirement2pkgname(provide)
+                # providing a real package, or itself, makes no vdep
+                if name not in self.localdb.package_dict:
+                    builder.add_dep(builder.node(name, VDEP), node)
+            for grp in pkg.groups:
+                builder.add_dep(builder.node(grp, GROUP), node)
+        if isinstance(self.localdb, SqlAbbsDB):
+            self.add_resolved_edges(builder)
+        else:
+            for pkg in self.packages:
+                node = builder.index[pkg.name]
+                for dep in pkg.depends:
+                    dependency = self.resolve_dependency(dep, builder)
+                    if dependency is not None:
+                        builder.add_dep(node, builder.index[dependency])
+                for dep in pkg.optdepends:
+                    resolved = self.resolve_dependency(dep, builder)
+                    if resolved is not None:
+                        builder.add_optdep(node, builder.index[resolved])
+        removed = set()
+        if not showallvdeps:
+            # remove vdeps without requiredby
+            hasreqs = builder.has_requiredby()
+            removed = {node for node, kind in enumerate(builder.kinds)
+                       if kind == VDEP and not hasreqs[node]}
+        self.graph = builder.build(removed)
+        for node, pkg in enumerate(self.graph.packages):
+            self.graph.isize[node] = pkg.size if pkg is not None else 0
+        self.repo.pkgs.update(self.graph.names)
+        self.condensation = None
         return self.all_pkgs
 
+    def add_resolved_edges(self, builder):
+        """ Edges resolved by SqlAbbsDB. Only the dependencies that do not
+        name a node, e.g. with a version constraint, are resolved here. """
+        def resolve(dep):
+            resolved = self.resolve_dependency(dep, builder)
+            return None if resolved is None else builder.index[resolved]
+        deps, optdeps = self.localdb.resolved_edges(builder.names,
+                                                    builder.kinds, resolve)
+        builder.extend_deps(*deps)
+        builder.extend_optdeps(*optdeps)
+        self.counters["resolve_lookups"] += len(deps[0]) + len(optdeps[0])
+
     def find_circles(self):
         """ https://zh.wikipedia.org/wiki/Tarjan%E7%AE%97%E6%B3%95 """
-        stack = list()
-        indexes = dict()
-        lowlinks = dict()
-        index = 0
-
-        def strongconnect(pkg):
-            nonlocal stack, indexes, lowlinks, index
-            indexes[pkg] = index
-            lowlinks[pkg] = index
-            index += 1
-            stack.append(pkg)
-            for dep in self.get(pkg).deps:
-                if dep not in indexes:
-                    strongconnect(dep)
-                    lowlinks[pkg] = min(lowlinks[pkg], lowlinks[dep])
-                elif dep in stack:
-                    lowlinks[pkg] = min(lowlinks[pkg], indexes[dep])
-            if lowlinks[pkg] == indexes[pkg]:
-                cirdeps = []
-                while True:
-                    w = stack.pop()
-                    cirdeps.append(w)
-                    if (w == pkg):
-                        break
-                self.get(pkg).circledeps = cirdeps
-
-        for pkg in self.all_pkgs:
-            if pkg not in indexes:
-                strongconnect(pkg)
-
-    def top_down_sort(self, usemagic, all_pkgs):
-        remain_pkgs = set(all_pkgs)
+        self.condensation = condense(range(len(self.graph)), self.graph.deps)
+        return self.condensation
+
+    def circledeps(self, node):
+        if self.condensation is None:
+            return []
+        members = self.condensation.members(node)
+        # only the root of a component, popped last, lists the circle
+        if members[-1] != node:
+            return []
+        return [self.graph.names[x] for x in members]
+
+    def timing(self, phase):
+        return PhaseTimer(self.timings, phase)
+
+    def top_down_sort(self, usemagic):
+        """ longest path from the leaves, one pass over the condensation
+        in dependency order (Kahn order of the component DAG) """
         start_message("Top-down sorting ")
-        while len(remain_pkgs) > 0:
-            pkg = remain_pkgs.pop()
-            pkginfo = self.get(pkg)
-            origin_level = pkginfo.level
-            append_message("%s %d (remaining %d)" % (pkg,
-                                                     origin_level,
-                                                     len(remain_pkgs)))
-            if len(all_pkgs.intersection(pkginfo.deps)) == 0:
-                if all([len(pkginfo.deps) == 0,
-                        len(pkginfo.requiredby) == 0]):
-                    pkginfo.level = 0
-                continue
-            max_level = 1 + max(self.get(x).level
-                                for x in all_pkgs.intersection(pkginfo.deps))
-            if usemagic:
-                # below is magic
-                new_level = max_level + int(math.log(1 +
-                                                     len(pkginfo.deps) +
-                                                     len(pkginfo.requiredby)))
-            else:
-                new_level = max_level  # we may not need magic at all
-            if new_level != origin_level:
-                pkginfo.level = new_level
-                remain_pkgs.update(
-                    all_pkgs.intersection(
-                        set(pkginfo.requiredby).difference(
-                            pkginfo.circledeps)))
-
-    def buttom_up_sort(self, all_pkgs):
-        remain_pkgs = set(all_pkgs)
+        graph = self.graph
+        level = graph.level
+        component_of = self.condensation.component_of
+        for cid, component in enumerate(self.condensation.components):
+            levels = []
+            for node in component:
+                deplevels = [level[x] for x in graph.deps(node)
+                             if component_of[x] != cid]
+                ndeps, nreqs = graph.ndeps(node), graph.nreqs(node)
+                if len(deplevels) == 0:
+                    if len(component) == 1 and ndeps == 0 and nreqs == 0:
+                        level[node] = 0
+                    continue
+                max_level = 1 + max(deplevels)
+                if usemagic:
+                    # below is magic
+                    levels.append(max_level + int(math.log(
+                        1 + ndeps + nreqs)))
+                else:
+                    levels.append(max_level)  # we may not need magic at all
+            if len(levels) == 0:
+                # nothing outside of this circle to stand on, keep level
+                if len(component) == 1:
+                    continue
+                levels = [level[node] for node in component]
+            # members of a dependency circle share one level
+            new_level = max(levels)
+            for node in component:
+                level[node] = new_level
+        self.counters["sort_iterations"] += len(self.condensation)
+        append_message("%d components" % len(self.condensation))
+
+    def buttom_up_sort(self):
+        """ lift packages to right below their lowest dependent, one pass
+        over the condensation in reverse dependency order """
         start_message("Buttom-up sorting ")
-        while len(remain_pkgs) > 0:
-            pkg = remain_pkgs.pop()
-            pkginfo = self.get(pkg)
-            origin_level = pkginfo.level
-            append_message("%s %d (remaining %d)" % (pkg,
-                                                     origin_level,
-                                                     len(remain_pkgs)))
-            if len(all_pkgs.intersection(pkginfo.requiredby)) == 0:
+        graph = self.graph
+        level = graph.level
+        component_of = self.condensation.component_of
+        components = self.condensation.components
+        for cid in range(len(components) - 1, -1, -1):
+            component = components[cid]
+            reqlevels = [level[x] for node in component
+                         for x in graph.requiredby(node)
+                         if component_of[x] != cid]
+            if len(reqlevels) == 0:
                 continue
-            min_level = min(self.get(x).level
-                            for x in all_pkgs.intersection(pkginfo.requiredby))
-            new_level = min_level - 1
-            if new_level > origin_level:
-                pkginfo.level = new_level
-                remain_pkgs.update(all_pkgs.intersection(set(pkginfo.deps)
-                                   .difference(pkginfo.circledeps)))
-
-    def minimize_levels(self, all_pkgs, nextlevel):
+            new_level = min(reqlevels) - 1
+            for node in component:
+                if new_level > level[node]:
+                    level[node] = new_level
+        self.counters["sort_iterations"] += len(components)
+        append_message("%d components" % len(components))
+
+    def minimize_levels(self, nextlevel):
         start_message("Minimizing levels ... ")
-        pkgs = list(sorted((self.get(pkg) for pkg in all_pkgs),
-                           key=lambda x: x.level))
-        for key, group in groupby(pkgs, key=lambda x: x.level):
-            for pkg in group:
-                pkg.level = nextlevel
-            nextlevel += 1
+        level = self.graph.level
+        levels = sorted(set(level))
+        newlevels = dict(zip(levels, range(nextlevel,
+                                           nextlevel + len(levels))))
+        for node in range(len(level)):
+            level[node] = newlevels[level[node]]
+        nextlevel += len(levels)
         append_message("max available level: %d" % nextlevel)
         return nextlevel
 
     def topology_sort(self, usemagic, aligntop, mergerepos=True):
-        all_pkgs = {x for x in self.all_pkgs}
-        self.top_down_sort(usemagic, all_pkgs)
-        self.buttom_up_sort(all_pkgs)
+        if self.condensation is None:
+            self.find_circles()
+        with self.timing("top_down_sort"):
+            self.top_down_sort(usemagic)
+        with self.timing("buttom_up_sort"):
+            self.buttom_up_sort()
         if aligntop:
             # do top_down_sort again to align to top
-            self.top_down_sort(usemagic, all_pkgs)
-        self.minimize_levels(all_pkgs, 1)
-
-    def calcCSize(self, pkg):
-        # really don't know
-        pkg.csize = 1
-        return pkg.csize
-
-    def calcCsSize(self, pkg):
-        # really don't know either
-        pkg.cssize = 1
-        return pkg.cssize
+            with self.timing("top_down_sort"):
+                self.top_down_sort(usemagic)
+        with self.timing("minimize_levels"):
+            self.minimize_levels(1)
+        print_message("Phase timings: " + ", ".join(
+            "%s %.3fs" % item for item in self.timings.items()))
 
     def calcSizes(self):
-        # start_message("Calculating csize ... ")
-        maxCSize = max(self.calcCSize(pkg) for pkg in self.all_pkgs.values())
-        # append_message(" max cSize: " + str(maxCSize))
-        # start_message("Calculating cssize ... ")
-        maxCsSize = max(self.calcCsSize(pkg) for pkg in self.all_pkgs.values())
-        # append_message(" max csSize: " + str(maxCsSize))
+        """ csize: isize of the package and everything it depends on.
+        cssize: isize of what can be removed together with the package,
+        i.e. what is only required through it. Members of a dependency
+        circle share both. """
+        if self.condensation is None:
+            self.find_circles()
+        start_message("Calculating sizes ... ")
+        graph = self.graph
+        components = self.condensation.components
+        weights = [sum(graph.isize[node] for node in component)
+                   for component in components]
+        csizes = closure_sizes(self.condensation, weights)
+        cssizes = dominator_sizes(self.condensation, weights)
+        for cid, component in enumerate(components):
+            for node in component:
+                graph.csize[node] = csizes[cid]
+                graph.cssize[node] = cssizes[cid]
+        append_message("max csize: %d, max cssize: %d" % (
+            max(csizes, default=0), max(cssizes, default=0)))
 
     def requirement2pkgname(self, requirement):
         if any(x in requirement for x in "<=>"):
             return RE_comp.split(requirement)[0]
         return requirement
 
-    def find_vdep(self, provide, pkg):
-        name = self.requirement2pkgname(provide)
-        if name in self.all_pkgs:
-            return name
-        if name not in self.vdeps:
-            VDepInfo(name, self)
-        self.vdeps[name].deps.append(pkg)
-        self.all_pkgs[pkg].requiredby.append(name)
-        return name
+
+class NodeMap(collections.abc.Mapping):
+    """ name -> PkgInfo view over the graph of a DbInfo """
+
+    def __init__(self, dbinfo):
+        self.dbinfo = dbinfo
+
+    def __getitem__(self, name):
+        graph = self.dbinfo.graph
+        if graph is None:
+            raise KeyError(name)
+        return self.dbinfo.view(graph.index[name])
+
+    def __contains__(self, name):
+        graph = self.dbinfo.graph
+        return graph is not None and name in graph.index
+
+    def __iter__(self):
+        graph = self.dbinfo.graph
+        return iter(graph.names if graph is not None else ())
+
+    def __len__(self):
+        graph = self.dbinfo.graph
+        return len(graph) if graph is not None else 0
+
+    def values(self):
+        graph = self.dbinfo.graph
+        return [self.dbinfo.view(node)
+                for node in range(len(graph) if graph is not None else 0)]
 
 
 class PkgInfo:
-    def __init__(self, name, dbinfo):
-        self.name = name
-        self.pkg = dbinfo.localdb.package_dict[name]
-        dbinfo.all_pkgs[name] = self
-        self.deps = []
-        self.requiredby = []
-        self.optdeps = []
-        self.level = 1
-        self.circledeps = []
-        self.explicit = 0  # REMOVE
-        self.isize = 1 # unknown
-        self.desc = self.pkg.desc
-        self.version = self.pkg.version
-        self.repo = dbinfo.find_syncdb(self.name)
-        self.section = self.pkg.section
-        self.groups = self.pkg.groups
-        self.provides = [dbinfo.find_vdep(pro, self.name)
-                         for pro in self.pkg.provides]
-        for grp in self.groups:
-            if grp in dbinfo.groups:
-                dbinfo.groups[grp].add_pkg(self.name)
-            else:
-                GroupInfo(grp, dbinfo)
-                dbinfo.groups[grp].add_pkg(self.name)
-
-    def find_dependencies(self, dbinfo):
-        for dep in self.pkg.depends:
-            dependency = dbinfo.resolve_dependency(dep)
-            if dependency in dbinfo.all_pkgs:
-                self.deps.append(dependency)
-                dbinfo.get(dependency).requiredby.append(self.name)
-        for dep in self.pkg.optdepends:
-            resolved = dbinfo.resolve_dependency(dep)
-            if resolved is not None:
-                self.optdeps.append(resolved)
-        # self.requiredby.extend(self.pkg.compute_requiredby())
+    """ A package node, viewed through the arrays of DbInfo.graph. """
 
+    __slots__ = ('dbinfo', 'id')
+    explicit = 0  # REMOVE
 
-class GroupInfo (PkgInfo):
-    def __init__(self, name, dbinfo):
-        self.name = name
-        self.deps = []
-        self.requiredby = []
-        self.optdeps = []
-        self.provides = []
-        self.level = 1
-        self.circledeps = []
-        self.groups = []
-        self.explicit = True
-        self.isize = 0
-        self.desc = name + " package group"
-        self.version = ""
-        self.repo = None
+    def __init__(self, dbinfo, node):
         self.dbinfo = dbinfo
-        self.dbinfo.groups[name] = self
-        self.dbinfo.all_pkgs[name] = self
+        self.id = node
 
-    def add_pkg(self, pkgname):
-        self.deps.append(pkgname)
-        self.dbinfo.get(pkgname).requiredby.append(self.name)
+    def names(self, nodes):
+        names = self.dbinfo.graph.names
+        return [names[x] for x in nodes]
 
-    def reset_repo(self):
-        for pkg in self.deps:
-            self.dbinfo.repo.pkgs.add(self.name)
-            return
+    @property
+    def name(self):
+        return self.dbinfo.graph.names[self.id]
 
-    def find_dependencies(self, dbinfo):
-        self.reset_repo()
+    @property
+    def pkg(self):
+        return self.dbinfo.graph.packages[self.id]
 
+    @property
+    def deps(self):
+        return self.names(self.dbinfo.graph.deps(self.id))
 
-class VDepInfo (PkgInfo):
-    def __init__(self, name, dbinfo):
-        self.name = name
-        self.deps = []
-        self.requiredby = []
-        self.optdeps = []
-        self.provides = []
-        self.level = 1
-        self.circledeps = []
-        self.groups = []
-        self.explicit = True
-        self.isize = 0
-        self.desc = name + " virtual dependency"
-        self.version = ""
-        self.repo = None
-        self.dbinfo = dbinfo
-        self.dbinfo.all_pkgs[name] = self
-        self.dbinfo.vdeps[name] = self
+    @property
+    def requiredby(self):
+        return self.names(self.dbinfo.graph.requiredby(self.id))
+
+    @property
+    def optdeps(self):
+        return self.names(self.dbinfo.graph.optdeps(self.id))
+
+    @property
+    def ndeps(self):
+        return self.dbinfo.graph.ndeps(self.id)
+
+    @property
+    def nreqs(self):
+        return self.dbinfo.graph.nreqs(self.id)
+
+    @property
+    def circledeps(self):
+        return self.dbinfo.circledeps(self.id)
+
+    @property
+    def level(self):
+        return self.dbinfo.graph.level[self.id]
+
+    @level.setter
+    def level(self, value):
+        self.dbinfo.graph.level[self.id] = value
+
+    @property
+    def isize(self):
+        return self.dbinfo.graph.isize[self.id]
+
+    @property
+    def csize(self):
+        return self.dbinfo.graph.csize[self.id]
+
+    @csize.setter
+    def csize(self, value):
+        self.dbinfo.graph.csize[self.id] = value
+
+    @property
+    def cssize(self):
+        return self.dbinfo.graph.cssize[self.id]
+
+    @cssize.setter
+    def cssize(self, value):
+        self.dbinfo.graph.cssize[self.id] = value
+
+    @property
+    def desc(self):
+        return self.pkg.desc
 
-    def reset_repo(self):
-        for pkg in self.deps:
-            self.dbinfo.repo.pkgs.add(self.name)
-            return
+    @property
+    def version(self):
+        return self.pkg.version
 
-    def find_dependencies(self, dbinfo):
-        self.reset_repo()
-        for dep in self.deps:
-            dbinfo.get(dep).requiredby.append(self.name)
+    @property
+    def repo(self):
+        return self.dbinfo.localdb.name
+
+    @property
+    def section(self):
+        return self.pkg.section
+
+    @property
+    def groups(self):
+        return self.pkg.groups
+
+    @property
+    def provides(self):
+        return [self.dbinfo.requirement2pkgname(pro)
+                for pro in self.pkg.provides]
+
+
+class GroupInfo (PkgInfo):
+    __slots__ = ()
+    explicit = True
+    desc_suffix = " package group"
+
+    @property
+    def desc(self):
+        return self.name + self.desc_suffix
+
+    version = ""
+    repo = None
+    section = None
+    groups = ()
+    provides = ()
+
+
+class VDepInfo (GroupInfo):
+    __slots__ = ()
+    desc_suffix = " virtual dependency"
+
+
+VIEWS = {
+    PACKAGE: PkgInfo,
+    GROUP: GroupInfo,
+    VDEP: VDepInfo,
+}
 
 
 class RepoInfo:
@@ -395,4 +749,3 @@ class RepoInfo:
 
     def add_pkg(self, pkgname):
         self.pkgs.add(pkgname)
-
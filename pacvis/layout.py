@@ -0,0 +1,103 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .console import start_message, append_message, print_message
+
+NODE_SPACING = 120
+LEVEL_SEPARATION = 300
+
+
+def available():
+    return np is not None
+
+
+def edge_arrays(graph):
+    """ (source, target) index arrays of the depends edges """
+    offsets = np.frombuffer(graph.dep_offsets, dtype=np.int32)
+    targets = np.frombuffer(graph.dep_targets, dtype=np.int32)
+    sources = np.repeat(np.arange(len(graph), dtype=np.int32),
+                        np.diff(offsets))
+    return sources, targets.astype(np.int32)
+
+
+def layer_ranks(levels):
+    """ position of every element of the sorted `levels` within its layer,
+    and the size of that layer """
+    n = len(levels)
+    starts = np.flatnonzero(np.r_[True, levels[1:] != levels[:-1]])
+    sizes = np.diff(np.r_[starts, n])
+    layer = np.repeat(np.arange(len(starts)), sizes)
+    return np.arange(n) - starts[layer], sizes[layer], layer
+
+
+def place(levels, keys, spacing):
+    """ order the nodes of every layer by `keys` and space them evenly
+    around 0 """
+    order = np.lexsort((keys, levels))
+    rank, size, layer = layer_ranks(levels[order])
+    x = np.empty(len(levels))
+    x[order] = (rank - (size - 1) / 2.0) * spacing
+    return x
+
+
+def barycenter(x, sources, targets):
+    """ mean x of the targets of every source, x where there is none """
+    n = len(x)
+    sums = np.bincount(sources, weights=x[targets], minlength=n)
+    counts = np.bincount(sources, minlength=n)
+    return np.where(counts > 0, sums / np.maximum(counts, 1), x)
+
+
+def separate(levels, x, spacing):
+    """ push apart nodes of a layer closer than `spacing`, keeping their
+    order and the mean x of the layer """
+    order = np.lexsort((x, levels))
+    xs = x[order]
+    rank, size, layer = layer_ranks(levels[order])
+    shifted = xs - rank * spacing
+    # a running maximum restarted at every layer: lift each layer above
+    # everything before it so the maximum never crosses layers
+    lift = (np.ptp(shifted) + 1) * layer
+    shifted = np.maximum.accumulate(shifted + lift) - lift
+    moved = shifted + rank * spacing
+    drift = (np.bincount(layer, weights=moved - xs) /
+             np.bincount(layer))[layer]
+    result = np.empty(len(x))
+    result[order] = moved - drift
+    return result
+
+
+def layered_layout(graph, sweeps=8, iterations=30, step=0.5,
+                   spacing=NODE_SPACING, separation=LEVEL_SEPARATION):
+    """ x/y coordinates for every node of `graph`.
+
+    Layers are the levels from topology_sort. The order inside each layer
+    is found by barycenter sweeps, alternately over depends and
+    required-by, then refined by pulling every node to the mean of its
+    neighbours while keeping `spacing` between nodes of a layer. """
+    levels = np.frombuffer(graph.level, dtype=np.int32).astype(np.int64)
+    sources, targets = edge_arrays(graph)
+    x = place(levels, np.arange(len(levels)), spacing)
+    for sweep in range(sweeps):
+        if sweep % 2 == 0:
+            keys = barycenter(x, sources, targets)
+        else:
+            keys = barycenter(x, targets, sources)
+        x = place(levels, keys, spacing)
+    both = (np.r_[sources, targets], np.r_[targets, sources])
+    for _ in range(iterations):
+        x = x + step * (barycenter(x, *both) - x)
+        x = separate(levels, x, spacing)
+    return x, levels * float(separation)
+
+
+def compute_layout(dbinfo):
+    if np is None:
+        print_message("numpy is not installed, skipping server side layout")
+        return None
+    start_message("Computing layout ... ")
+    dbinfo.layout = layered_layout(dbinfo.graph)
+    append_message("%d nodes" % len(dbinfo.graph))
+    return dbinfo.layout
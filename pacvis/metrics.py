@@ -0,0 +1,124 @@
+import threading
+
+# name -> (type, help), in the order of the exposition
+METRICS = {
+    "pacvis_stage_seconds_total": (
+        "counter", "Seconds spent in each stage of building and sending graphs"),
+    "pacvis_stage_runs_total": (
+        "counter", "Runs of each stage"),
+    "pacvis_builds_total": (
+        "counter", "Graphs built, by how they were obtained"),
+    "pacvis_resolve_lookups_total": (
+        "counter", "Dependencies resolved to a node while building graphs"),
+    "pacvis_sort_iterations_total": (
+        "counter", "Components visited by the topology sort passes"),
+    "pacvis_nodes_emitted_total": (
+        "counter", "Nodes rendered for /api/graph"),
+    "pacvis_links_emitted_total": (
+        "counter", "Links rendered for /api/graph"),
+    "pacvis_not_modified_total": (
+        "counter", "/api/graph requests answered with 304"),
+    "pacvis_requests_total": (
+        "counter", "Requests by handler"),
+    "pacvis_cache_hits_total": (
+        "counter", "Graph cache hits by db"),
+    "pacvis_cache_misses_total": (
+        "counter", "Graph cache misses by db"),
+    "pacvis_cache_coalesced_total": (
+        "counter", "Requests that waited for a graph already being built"),
+    "pacvis_cache_entries": (
+        "gauge", "Graphs in the cache of each db"),
+    "pacvis_cache_bytes": (
+        "gauge", "Estimated bytes of the graphs in the cache of each db"),
+    "pacvis_pooled_packages": (
+        "gauge", "Distinct packages shared by the graphs of all dbs"),
+    "pacvis_payload_hits_total": (
+        "counter", "Rendered payload cache hits"),
+    "pacvis_payload_misses_total": (
+        "counter", "Rendered payload cache misses"),
+    "pacvis_payload_bytes": (
+        "gauge", "Bytes of the rendered payloads in the encodings sent"),
+}
+
+# DbInfo.counters key -> metric
+DBINFO_COUNTERS = {
+    "resolve_lookups": "pacvis_resolve_lookups_total",
+    "sort_iterations": "pacvis_sort_iterations_total",
+}
+
+# graphs are built in executor threads
+lock = threading.Lock()
+# (name, ((label, value), ...)) -> value
+values = {}
+
+
+def inc(name, amount=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with lock:
+        values[key] = values.get(key, 0) + amount
+
+
+def observe(stage, seconds):
+    inc("pacvis_stage_seconds_total", seconds, stage=stage)
+    inc("pacvis_stage_runs_total", stage=stage)
+
+
+def record_dbinfo(dbinfo, how):
+    """ add the timings and counters of a freshly obtained DbInfo """
+    inc("pacvis_builds_total", how=how)
+    for stage, seconds in dbinfo.timings.items():
+        observe(stage, seconds)
+    for counter, name in DBINFO_COUNTERS.items():
+        inc(name, dbinfo.counters.get(counter, 0))
+
+
+def reset():
+    with lock:
+        values.clear()
+
+
+def timing_header(timings):
+    """ X-PacVis-Timing value, stage=seconds pairs """
+    return ", ".join("%s=%.6f" % item for item in timings.items())
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"' % (label, str(value).replace("\\", "\\\\")
+                     .replace('"', '\\"').replace("\n", "\\n"))
+        for label, value in labels)
+
+
+def exposition(caches=None, payloads=None, pool=None):
+    """ all metrics in the Prometheus text format, `caches` maps db names
+    to their GraphCache """
+    with lock:
+        samples = dict(values)
+    for db, cache in (caches or {}).items():
+        labels = (("db", db),)
+        samples[("pacvis_cache_hits_total", labels)] = cache.hits
+        samples[("pacvis_cache_misses_total", labels)] = cache.misses
+        samples[("pacvis_cache_coalesced_total", labels)] = cache.coalesced
+        samples[("pacvis_cache_entries", labels)] = len(cache.entries)
+        samples[("pacvis_cache_bytes", labels)] = cache.totalbytes
+    if pool is not None:
+        samples[("pacvis_pooled_packages", ())] = len(pool)
+    if payloads is not None:
+        samples[("pacvis_payload_hits_total", ())] = payloads.hits
+        samples[("pacvis_payload_misses_total", ())] = payloads.misses
+        samples[("pacvis_payload_bytes", ())] = payloads.totalbytes
+    lines = []
+    for name, (kind, text) in METRICS.items():
+        series = sorted((labels, value) for (metric, labels), value
+                        in samples.items() if metric == name)
+        if not series:
+            continue
+        lines.append("# HELP %s %s" % (name, text))
+        lines.append("# TYPE %s %s" % (name, kind))
+        for labels, value in series:
+            lines.append("%s%s %s" % (name, format_labels(labels),
+                                      repr(float(value)) if
+                                      isinstance(value, float) else value))
+    return "\n".join(lines) + "\n"
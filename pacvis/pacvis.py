@@ -1,18 +1,44 @@
 #!/usr/bin/env python
 
 import os
+import sys
 import json
+import argparse
+from time import perf_counter
 from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
 
 import tornado.ioloop
 import tornado.web
 
-from .console import start_message, append_message, print_message
-from .infos import DbInfo, GroupInfo, VDepInfo
+from . import console
+from .console import print_message
+from .cache import GraphCache
+from .infos import LOADERS, package_pool
+from .aggregate import AGGREGATE_MODES
+from .render import DEFAULT_OPTIONS
+from .payload import payload_cache
+from . import payload
+from . import export
+from . import impact
+from . import search
+from . import analytics
+from . import metrics
 
 
 # Tornado entry
-class MainHandler(tornado.web.RequestHandler):
+class PacVisHandler(tornado.web.RequestHandler):
+
+    def write_error(self, status_code, **kwargs):
+        """ the message of an HTTPError as plain text, for the page to
+        show """
+        message = self._reason
+        error = kwargs.get("exc_info", (None, None))[1]
+        if isinstance(error, tornado.web.HTTPError) and error.log_message:
+            message = (error.log_message % error.args if error.args
+                       else error.log_message)
+        self.set_header("Content-Type", "text/plain; charset=UTF-8")
+        self.finish("%d: %s\n" % (status_code, message))
 
     def parse_args(self, **kargs):
         result = {}
@@ -24,136 +50,219 @@ class MainHandler(tornado.web.RequestHandler):
                 result[key] = self.get_argument(key, defvalue) != "False"
             else:
                 result[key] = self.get_argument(key, defvalue)
-            print_message("get arg %r: %r" % (key, result[key]))
+            # every search keystroke parses all options
+            console.logger.debug("get arg %r: %r", key, result[key])
         return result
 
+    def graph_args(self):
+        return SimpleNamespace(**self.parse_args(**DEFAULT_OPTIONS))
+
+    def database(self):
+        """ name and path of the db argument, the first --db by default """
+        dbs = self.settings["dbs"]
+        name = self.get_argument("db", next(iter(dbs)))
+        if name not in dbs:
+            raise tornado.web.HTTPError(404, "no database %s" % name)
+        return name, dbs[name]
+
+
+class MainHandler(PacVisHandler):
+
     def get(self):
         print_message("\n" + str(self.request))
-        args = SimpleNamespace(**self.parse_args(
-            maxlevel=1000,
-            maxreqs=1000,
-            maxdeps=1000,
-            usemagic=False,
-            straightline=False,
-            enablephysics=False,
-            aligntop=False,
-            disableallphysics=False,
-            debugperformance=False,
-            mergerepos=False,
-            showallvdeps=False))
-        dbinfo = DbInfo()
-        start_message("Loading local database ...")
-        dbinfo.find_all(args.showallvdeps)
-        append_message("done")
-        start_message("Finding all dependency circles ... ")
-        dbinfo.find_circles()
-        #for name, pkg in dbinfo.all_pkgs.items():
-                #if len(pkg.circledeps) > 1:
-                    #print_message("%s(%s): %s" %
-                                  #(pkg.name, pkg.circledeps, ", ".join(pkg.deps)))
-        append_message("done")
-        dbinfo.topology_sort(args.usemagic, args.aligntop, args.mergerepos)
-        dbinfo.calcSizes()
-
-        start_message("Rendering ... ")
-
-        nodes = []
-        links = []
-
-        nodes.append({"id": 0,
-                      "label": "level 1 group",
-                      "level": 0,
-                      "shape": "triangleDown",
-                      "isize": 0,
-                      "csize": 0,
-                      "cssize": 0,
-                      "deps": "",
-                      "reqs": "",
-                      "optdeps": "",
-                      "desc": "",
-                      "version": "",
-                      "group": "group",
-                      "groups": "",
-                      "provides": "",
-                      })
-
-        ids = 1
-        for pkg in sorted(dbinfo.all_pkgs.values(), key=lambda x: x.level):
-            append_message("%s" % pkg.name)
-            pkg.id = ids
-            ids += 1
-            if pkg.level < args.maxlevel:
-                group = "normal"
-                if pkg.level == 0:
-                    group = "standalone"
-                elif type(pkg) is GroupInfo:
-                    group = "group"
-                elif type(pkg) is VDepInfo:
-                    group = "vdep"
-                    # if not args.showallvdeps and len(pkg.requiredby) == 0:
-                    #     continue
-                elif pkg.explicit:
-                    group = "explicit"
-                nodes.append({"id": pkg.id,
-                              "label": pkg.name,
-                              "level": pkg.level,
-                              "group": group,
-                              "isize": pkg.isize,
-                              "csize": pkg.csize,
-                              "cssize": pkg.cssize,
-                              "deps": ", ".join(pkg.deps),
-                              "reqs": ", ".join(pkg.requiredby),
-                              "optdeps": ", ".join(pkg.optdeps),
-                              "groups": ", ".join(pkg.groups),
-                              "provides": ", ".join(pkg.provides),
-                              "desc": pkg.desc,
-                              "version": pkg.version,
-                              "repo": pkg.section,
-                              })
-        ids = 0
-        for pkg in sorted(dbinfo.all_pkgs.values(), key=lambda x: x.level):
-            if pkg.level < args.maxlevel:
-                if len(pkg.deps) == 0 and len(pkg.requiredby) == 0:
-                    links.append({"id": ids,
-                                  "from": pkg.id,
-                                  "to": 0})
-                    ids += 1
-                if len(pkg.deps) < args.maxdeps:
-                    for dep in pkg.deps:
-                        if dep not in pkg.circledeps:
-                            if len(dbinfo.get(dep).requiredby) < args.maxreqs:
-                                links.append({"id": ids,
-                                              "from": pkg.id,
-                                              "to": dbinfo.get(dep).id})
-                                ids += 1
-                for dep in pkg.circledeps:
-                    if (pkg.id != dbinfo.get(dep).id):
-                        links.append({"id": ids,
-                                      "to": pkg.id,
-                                      "from": dbinfo.get(dep).id,
-                                      "color": "rgb(244,67,54,0.8)"})
-                        ids += 1
-                for dep in pkg.optdeps:
-                    if dep in dbinfo.all_pkgs:
-                        links.append({"id": ids,
-                                      "from": pkg.id,
-                                      "to": dbinfo.get(dep).id,
-                                      "dashes": True,
-                                      "color": "rgb(255,235,59)"})
-                        ids += 1
-        print_message("Writing HTML")
+        metrics.inc("pacvis_requests_total", handler="main")
+        args = self.graph_args()
+        name, db = self.database()
+        # the graph itself is streamed from GraphHandler by the page
         self.render("templates/index.template.html",
-                    nodes=json.dumps(nodes),
-                    links=json.dumps(links),
                     options=args,
-                    optionsjson=json.dumps(args.__dict__))
+                    optionsjson=json.dumps(dict(args.__dict__, db=name)),
+                    dbs=list(self.settings["dbs"]),
+                    db=name,
+                    assets=None,
+                    graphjson=None)
+
+
+class GraphHandler(PacVisHandler):
+
+    async def get(self):
+        print_message("\n" + str(self.request))
+        metrics.inc("pacvis_requests_total", handler="graph")
+        args = self.graph_args()
+        if args.aggregate and args.aggregate not in AGGREGATE_MODES:
+            raise tornado.web.HTTPError(400, "unknown aggregate mode %s" %
+                                        args.aggregate)
+        name, db = self.database()
+        graph_cache = self.settings["caches"][name]
+        executor = self.settings["executor"]
+        key = graph_cache.key(db, args)
+        digest = graph_cache.digests.get(key[:3])
+        if digest is None:
+            digest = await tornado.ioloop.IOLoop.current().run_in_executor(
+                executor, graph_cache.digest, key)
+        tag = payload.payload_tag(digest, args)
+        encoding = payload.choose_encoding(
+            self.request.headers.get("Accept-Encoding", ""))
+        self.set_header("Content-Type", "application/x-ndjson")
+        self.set_header("Vary", "Accept-Encoding")
+        self.set_header("Etag", payload.etag(tag, encoding))
+        if self.check_etag_header():
+            metrics.inc("pacvis_not_modified_total")
+            self.set_status(304)
+            return
+        timings = {}
+        body = await payload_cache.get_async(tag, encoding, executor)
+        if body is None:
+            start = perf_counter()
+            dbinfo = await graph_cache.get_async(db, args, executor)
+            timings["wait"] = perf_counter() - start
+            metrics.observe("wait", timings["wait"])
+            for pkg in (args.pkg, args.pathto):
+                if pkg and pkg not in dbinfo.all_pkgs:
+                    raise tornado.web.HTTPError(404, "no package %s" % pkg)
+            timings.update(dbinfo.timings)
+        # headers go out with the first line, before rendering is done
+        if self.settings["timingheader"] and timings:
+            self.set_header("X-PacVis-Timing", metrics.timing_header(timings))
+        if encoding != payload.IDENTITY:
+            self.set_header("Content-Encoding", encoding)
+        if body is not None:
+            self.write(body)
+            return
+        stats = await payload_cache.stream(tag, encoding, dbinfo, args,
+                                           self.write_flushed, executor)
+        metrics.observe("render", stats["seconds"])
+        metrics.observe("compress", stats["compress"])
+        metrics.inc("pacvis_nodes_emitted_total", stats["nodes"])
+        metrics.inc("pacvis_links_emitted_total", stats["links"])
+
+    async def write_flushed(self, data):
+        self.write(data)
+        await self.flush()
+
+
+class ImpactHandler(PacVisHandler):
+
+    async def get(self):
+        print_message("\n" + str(self.request))
+        metrics.inc("pacvis_requests_total", handler="impact")
+        args = self.graph_args()
+        names = impact.split_packages(self.get_arguments("pkgs"))
+        if not names:
+            raise tornado.web.HTTPError(400, "no pkgs given")
+        name, db = self.database()
+        graph_cache = self.settings["caches"][name]
+        dbinfo = await graph_cache.get_async(db, args,
+                                             self.settings["executor"])
+        missing = [pkg for pkg in names if pkg not in dbinfo.all_pkgs]
+        if missing:
+            raise tornado.web.HTTPError(404, "no package %s" %
+                                        ", ".join(missing))
+        data = impact.impact_data(dbinfo, names)
+        metrics.observe("impact", data["seconds"])
+        self.set_header("Content-Type", "application/json")
+        self.write(json.dumps(data))
+
+    # hundreds of changed packages do not fit in a URL
+    post = get
+
+
+class SearchHandler(PacVisHandler):
+
+    async def get(self):
+        metrics.inc("pacvis_requests_total", handler="search")
+        args = self.graph_args()
+        query = self.get_argument("q", "")
+        try:
+            offset = max(0, int(self.get_argument("offset", "0")))
+            limit = min(search.MAX_PAGE_SIZE, int(self.get_argument(
+                "limit", str(search.PAGE_SIZE))))
+        except ValueError:
+            raise tornado.web.HTTPError(400, "bad offset or limit")
+        name, db = self.database()
+        graph_cache = self.settings["caches"][name]
+        executor = self.settings["executor"]
+        dbinfo = await graph_cache.get_async(db, args, executor)
+        loop = tornado.ioloop.IOLoop.current()
+        if dbinfo.search_index is None:
+            start = perf_counter()
+            await loop.run_in_executor(executor, search.search_index, dbinfo)
+            metrics.observe("search_index", perf_counter() - start)
+        start = perf_counter()
+        data = await loop.run_in_executor(executor, search.search_data,
+                                          dbinfo, query, offset,
+                                          max(0, limit))
+        metrics.observe("search", perf_counter() - start)
+        self.set_header("Content-Type", "application/json")
+        self.write(json.dumps(data))
+
+
+class AnalyticsHandler(PacVisHandler):
+
+    async def get(self):
+        print_message("\n" + str(self.request))
+        metrics.inc("pacvis_requests_total", handler="analytics")
+        if not analytics.available():
+            raise tornado.web.HTTPError(501, "numpy is not installed")
+        args = self.graph_args()
+        try:
+            top = max(0, int(self.get_argument("top", str(analytics.TOP))))
+        except ValueError:
+            raise tornado.web.HTTPError(400, "bad top")
+        name, db = self.database()
+        graph_cache = self.settings["caches"][name]
+        executor = self.settings["executor"]
+        dbinfo = await graph_cache.get_async(db, args, executor)
+        if dbinfo.analytics is None:
+            await tornado.ioloop.IOLoop.current().run_in_executor(
+                executor, analytics.graph_analytics, dbinfo)
+            metrics.observe("analytics", dbinfo.analytics.seconds)
+        self.set_header("Content-Type", "application/json")
+        self.write(json.dumps(dbinfo.analytics.as_dict(top)))
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4")
+        self.write(metrics.exposition(self.settings["caches"], payload_cache,
+                                      package_pool))
+
+
+def parse_databases(specs):
+    """ name -> path of the --db arguments, each name=path or a path
+    named like its export files """
+    dbs = {}
+    for spec in specs:
+        name, sep, path = spec.partition("=")
+        if not sep:
+            name, path = export.output_name(spec), spec
+        if name in dbs:
+            raise ValueError("two databases named %s" % name)
+        dbs[name] = path
+    return dbs
 
 
-def make_app():
+def make_app(dbs="abbs.db", workers=2, timingheader=False, loader="python"):
+    if isinstance(dbs, str):
+        dbs = [dbs]
+    if not isinstance(dbs, dict):
+        dbs = parse_databases(dbs)
     return tornado.web.Application([
         (r"/", MainHandler),
+        (r"/api/graph", GraphHandler),
+        (r"/api/impact", ImpactHandler),
+        (r"/api/search", SearchHandler),
+        (r"/api/analytics", AnalyticsHandler),
+        (r"/metrics", MetricsHandler),
         ], debug=True,
-        static_path=os.path.join(os.path.dirname(__file__), "static"))
+        static_path=os.path.join(os.path.dirname(__file__), "static"),
+        dbs=dbs,
+        # each db evicts its own graphs
+        caches={name: GraphCache(loader=loader) for name in dbs},
+        # graphs are built here, off the IOLoop
+        executor=ThreadPoolExecutor(workers),
+        timingheader=timingheader)
 
 
 def make_wsgi():
@@ -161,12 +270,57 @@ def make_wsgi():
     return tornado.wsgi.WSGIAdapter(make_app())
 
 
-def main():
-    app = make_app()
-    app.listen(8888)
-    print_message("Start PacVis at http://localhost:8888/")
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Visualize the packages in an abbs.db")
+    parser.add_argument("-p", "--port", type=int, default=8888)
+    parser.add_argument("--db", action="append",
+                        help="abbs.db to serve, or name=path, repeat for "
+                        "more; the first is the default of the db argument")
+    parser.add_argument("--workers", type=int, default=2,
+                        help="threads building graphs")
+    parser.add_argument("--timing-header", action="store_true",
+                        help="send stage timings in X-PacVis-Timing")
+    parser.add_argument("--loader", default="python", choices=sorted(LOADERS),
+                        help="sql resolves the dependencies in SQLite")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="no progress or messages on stderr")
+    parser.add_argument("--log-file", help="append log messages to this file")
+    parser.add_argument("--log-level", default="INFO",
+                        choices=("DEBUG", "INFO", "WARNING", "ERROR"),
+                        help="DEBUG also logs progress messages")
+    parser.add_argument("--progress-rate", type=float,
+                        default=console.PROGRESS_RATE,
+                        help="progress updates per second, 0 for all")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("serve", help="run the web server (default)")
+    export.add_arguments(commands.add_parser(
+        "export", help="write graphs to files without a server"))
+    impact.add_arguments(commands.add_parser(
+        "impact", help="print what to rebuild, in waves, when packages "
+        "of the first --db change"))
+    analytics.add_arguments(commands.add_parser(
+        "analytics", help="report hubs, circles, chains and levels of the "
+        "first --db (needs numpy)"))
+    args = parser.parse_args(argv)
+    console.configure(args.quiet, args.log_file, args.log_level,
+                      args.progress_rate)
+    args.db = args.db or ["abbs.db"]
+    if args.command == "export":
+        return export.run(args)
+    try:
+        dbs = parse_databases(args.db)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.command == "impact":
+        return impact.run(args, dbs)
+    if args.command == "analytics":
+        return analytics.run(args, dbs)
+    app = make_app(dbs, args.workers, args.timing_header, args.loader)
+    app.listen(args.port)
+    print_message("Start PacVis at http://localhost:%d/" % args.port)
     tornado.ioloop.IOLoop.current().start()
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
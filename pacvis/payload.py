@@ -0,0 +1,211 @@
+import zlib
+import json
+import asyncio
+import hashlib
+import collections
+from time import perf_counter
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from .cache import GRAPH_OPTIONS
+from .render import iter_graph_lines, VIEW_OPTIONS
+
+# bump whenever the rendered payload changes for the same graph
+PAYLOAD_VERSION = 5
+
+# Content-Encoding -> factory of (feed, finish): feed compresses a piece
+# and flushes it so the client can decode it at once, finish ends the
+# stream. Most preferred first.
+ENCODINGS = collections.OrderedDict()
+if brotli is not None:
+    def brotli_stream():
+        compressor = brotli.Compressor(quality=9)
+        return (lambda data: compressor.process(data) + compressor.flush(),
+                compressor.finish)
+    ENCODINGS["br"] = brotli_stream
+if zstandard is not None:
+    def zstd_stream():
+        compressor = zstandard.ZstdCompressor(level=12).compressobj()
+        return (lambda data: compressor.compress(data) + compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK), compressor.flush)
+    ENCODINGS["zstd"] = zstd_stream
+
+
+def gzip_stream():
+    # the gzip header zlib writes has no mtime, so the bytes, and the
+    # ETag, stay the same
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return (lambda data: compressor.compress(data) + compressor.flush(
+        zlib.Z_SYNC_FLUSH), compressor.flush)
+
+
+ENCODINGS["gzip"] = gzip_stream
+
+IDENTITY = "identity"
+
+# Content-Encoding -> whole body back to the NDJSON
+DECODERS = {IDENTITY: bytes, "gzip": lambda data: zlib.decompress(data, 31)}
+if brotli is not None:
+    DECODERS["br"] = brotli.decompress
+if zstandard is not None:
+    DECODERS["zstd"] = lambda data: zstandard.ZstdDecompressor(
+    ).decompressobj().decompress(data)
+
+
+def payload_tag(digest, args):
+    """ ETag of the payload for the db with checksum `digest`, without
+    the encoding """
+    options = [PAYLOAD_VERSION, digest]
+    options.extend(getattr(args, opt) for opt in GRAPH_OPTIONS + VIEW_OPTIONS)
+    return hashlib.sha256(json.dumps(options).encode()).hexdigest()[:32]
+
+
+def etag(tag, encoding):
+    # different bytes for each encoding, so a strong ETag each
+    return '"%s-%s"' % (tag, encoding)
+
+
+def choose_encoding(accept):
+    """ best stored encoding the Accept-Encoding header `accept` allows """
+    allowed = {}
+    for item in accept.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        allowed[coding.strip().lower()] = quality
+    for encoding in ENCODINGS:
+        if allowed.get(encoding, allowed.get("*", 0.0)) > 0:
+            return encoding
+    return IDENTITY
+
+
+def identity_stream():
+    return (lambda data: data, lambda: b"")
+
+
+def encoded_lines(lines, encoding, stats):
+    """ The pieces of the body in `encoding` for the NDJSON `lines`, one
+    per line, then the end of the stream. `stats` gets the seconds spent
+    compressing. """
+    feed, finish = ENCODINGS.get(encoding, identity_stream)()
+    stats.setdefault("compress", 0.0)
+    for line in lines:
+        start = perf_counter()
+        piece = feed(line)
+        stats["compress"] += perf_counter() - start
+        yield piece
+    yield finish()
+
+
+def recode(body, stored, encoding):
+    """ `body` in `encoding` instead of `stored`, compressed line by line
+    to the same bytes as if it had been streamed in `encoding` """
+    lines = DECODERS[stored](body).splitlines(keepends=True)
+    return b"".join(encoded_lines(lines, encoding, {}))
+
+
+class PayloadCache:
+    """ Rendered payloads by payload_tag, in the encodings they were sent
+    in so far, least recently used dropped first beyond `maxbytes`. """
+
+    def __init__(self, maxbytes=256 * 1024 * 1024):
+        self.maxbytes = maxbytes
+        # tag -> {encoding: body}
+        self.entries = collections.OrderedDict()
+        self.totalbytes = 0
+        self.hits = 0
+        self.misses = 0
+        # tag -> future done when the render in flight is
+        self.pending = {}
+
+    def lookup(self, tag, encoding):
+        """ the body of `tag` in `encoding`, if cached like that """
+        bodies = self.entries.get(tag)
+        if bodies is None or encoding not in bodies:
+            return None
+        self.hits += 1
+        self.entries.move_to_end(tag)
+        return bodies[encoding]
+
+    async def get_async(self, tag, encoding, executor=None):
+        """ The body of `tag` in `encoding`, recoded in `executor` if it
+        is only cached in other encodings, or None. Waits for a render of
+        `tag` already in flight. """
+        future = self.pending.get(tag)
+        if future is not None:
+            await asyncio.shield(future)
+        body = self.lookup(tag, encoding)
+        if body is not None or tag not in self.entries:
+            return body
+        self.hits += 1
+        self.entries.move_to_end(tag)
+        stored, body = next(iter(self.entries[tag].items()))
+        body = await asyncio.get_running_loop().run_in_executor(
+            executor, recode, body, stored, encoding)
+        self.put(tag, encoding, body)
+        return body
+
+    async def stream(self, tag, encoding, dbinfo, args, write,
+                     executor=None):
+        """ Render the payload of `tag` a line at a time in `executor`
+        and pass each line, compressed in `encoding` and flushed, to the
+        coroutine `write` as soon as it is ready, so that the client
+        parses the first nodes while the rest is rendered. The body is
+        cached once complete. Returns the render stats. """
+        self.misses += 1
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        # another request may have started the same render meanwhile
+        registered = self.pending.setdefault(tag, done) is done
+        try:
+            stats = {}
+            lines = (line.encode() for line in
+                     iter_graph_lines(dbinfo, args, stats=stats))
+            pieces = encoded_lines(lines, encoding, stats)
+            body = []
+            while True:
+                piece = await loop.run_in_executor(executor, next, pieces,
+                                                   None)
+                if piece is None:
+                    break
+                body.append(piece)
+                if piece:
+                    await write(piece)
+            self.put(tag, encoding, b"".join(body))
+            return stats
+        finally:
+            if registered:
+                del self.pending[tag]
+            done.set_result(None)
+
+    def put(self, tag, encoding, body):
+        bodies = self.entries.setdefault(tag, {})
+        self.totalbytes += len(body) - len(bodies.get(encoding, b""))
+        bodies[encoding] = body
+        self.entries.move_to_end(tag)
+        while len(self.entries) > 1 and self.totalbytes > self.maxbytes:
+            self.evict(next(iter(self.entries)))
+
+    def evict(self, tag):
+        bodies = self.entries.pop(tag)
+        self.totalbytes -= sum(map(len, bodies.values()))
+
+    def clear(self):
+        self.entries.clear()
+        self.totalbytes = 0
+
+
+payload_cache = PayloadCache()
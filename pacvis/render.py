@@ -0,0 +1,312 @@
+import json
+import itertools
+from time import perf_counter
+
+from .console import start_message, append_message, print_message
+from .infos import GroupInfo, VDepInfo
+from .graph import breadth_first, shortest_path
+from .layout import LEVEL_SEPARATION
+from .aggregate import cluster_nodes, cluster_edges, AGGREGATE_MODES
+
+CHUNK_SIZE = 500
+# member names listed in the description of a cluster
+CLUSTER_NAMES = 20
+
+# page and graph options with their defaults, their types are the types
+# of the query arguments
+DEFAULT_OPTIONS = dict(
+    maxlevel=1000,
+    maxreqs=1000,
+    maxdeps=1000,
+    usemagic=False,
+    straightline=False,
+    enablephysics=False,
+    aligntop=False,
+    disableallphysics=False,
+    debugperformance=False,
+    mergerepos=False,
+    showallvdeps=False,
+    serverlayout=False,
+    # pactree style queries, see select_nodes
+    pkg="",
+    depth=-1,
+    reverse=False,
+    pathto="",
+    # collapse clusters into one node each, see aggregate.AGGREGATE_MODES,
+    # except the comma separated cluster keys in expand
+    aggregate="",
+    expand="",
+)
+
+# options that change the payload of /api/graph for a built graph
+VIEW_OPTIONS = ('maxlevel', 'maxreqs', 'maxdeps', 'pkg', 'depth', 'reverse',
+                'pathto', 'aggregate', 'expand')
+
+
+def select_nodes(dbinfo, args):
+    """ node ids answering the pkg/depth/reverse/pathto query of `args`,
+    or None for the whole graph """
+    if not args.pkg:
+        return None
+    graph = dbinfo.graph
+    start = graph.index[args.pkg]
+    if args.pathto:
+        goal = graph.index[args.pathto]
+        path = shortest_path(start, goal, graph.deps)
+        if path is None:
+            path = shortest_path(start, goal, graph.requiredby)
+        # unconnected either way, nothing to show
+        return path or []
+    successors = graph.requiredby if args.reverse else graph.deps
+    return list(breadth_first([start], successors, args.depth))
+
+
+def level_order(dbinfo, nodes=None):
+    if nodes is None:
+        pkgs = dbinfo.all_pkgs.values()
+    else:
+        pkgs = [dbinfo.view(node) for node in nodes]
+    return sorted(pkgs, key=lambda x: x.level)
+
+
+def assign_ids(pkgs):
+    # id 0 is the "level 1 group" root, and ids are kept out of the
+    # cached PkgInfo objects
+    return {pkg.name: pkgid for pkgid, pkg in enumerate(pkgs, 1)}
+
+
+def iter_nodes(dbinfo, args, pkgs, pkgids):
+    start_message("Rendering ... ")
+    root = {"id": 0,
+            "label": "level 1 group",
+            "level": 0,
+            "shape": "triangleDown",
+            "isize": 0,
+            "csize": 0,
+            "cssize": 0,
+            "deps": [],
+            "reqs": [],
+            "optdeps": [],
+            "desc": "",
+            "version": "",
+            "group": "group",
+            "groups": "",
+            "provides": "",
+            }
+    if dbinfo.layout is not None:
+        # above the first layer
+        root["x"], root["y"] = 0, -LEVEL_SEPARATION
+    yield root
+    # neighbours are listed by node id when the node is sent too, the
+    # page looks the names up once all nodes arrived
+    shown = {pkg.name: pkgids[pkg.name] for pkg in pkgs
+             if pkg.level < args.maxlevel}
+
+    def refs(names):
+        return [shown.get(name, name) for name in names]
+
+    for pkg in pkgs:
+        append_message("%s" % pkg.name)
+        if pkg.level < args.maxlevel:
+            group = "normal"
+            if pkg.level == 0:
+                group = "standalone"
+            elif type(pkg) is GroupInfo:
+                group = "group"
+            elif type(pkg) is VDepInfo:
+                group = "vdep"
+            elif pkg.explicit:
+                group = "explicit"
+            node = {"id": pkgids[pkg.name],
+                    "label": pkg.name,
+                    "level": pkg.level,
+                    "group": group,
+                    "isize": pkg.isize,
+                    "csize": pkg.csize,
+                    "cssize": pkg.cssize,
+                    "deps": refs(pkg.deps),
+                    "reqs": refs(pkg.requiredby),
+                    "optdeps": refs(pkg.optdeps),
+                    "groups": ", ".join(pkg.groups),
+                    "provides": ", ".join(pkg.provides),
+                    "desc": pkg.desc,
+                    "version": pkg.version,
+                    "repo": pkg.section,
+                    }
+            if dbinfo.layout is not None:
+                node["x"] = round(float(dbinfo.layout[0][pkg.id]), 1)
+                node["y"] = round(float(dbinfo.layout[1][pkg.id]), 1)
+            yield node
+
+
+def iter_links(dbinfo, args, pkgs, pkgids):
+    graph = dbinfo.graph
+    ids = 0
+    for pkg in pkgs:
+        if pkg.level < args.maxlevel:
+            pkgid = pkgids[pkg.name]
+            if pkg.ndeps == 0 and pkg.nreqs == 0:
+                yield {"id": ids,
+                       "from": pkgid,
+                       "to": 0}
+                ids += 1
+            # the whole circle for its root, which can be thousands long
+            circledeps = pkg.circledeps
+            circle = set(circledeps)
+            if pkg.ndeps < args.maxdeps:
+                for dep in graph.deps(pkg.id):
+                    name = graph.names[dep]
+                    if (name in pkgids and name not in circle and
+                            graph.nreqs(dep) < args.maxreqs):
+                        yield {"id": ids,
+                               "from": pkgid,
+                               "to": pkgids[name]}
+                        ids += 1
+            for dep in circledeps:
+                if dep in pkgids and pkgid != pkgids[dep]:
+                    yield {"id": ids,
+                           "to": pkgid,
+                           "from": pkgids[dep],
+                           "color": "rgb(244,67,54,0.8)"}
+                    ids += 1
+            for dep in pkg.optdeps:
+                if dep in pkgids:
+                    yield {"id": ids,
+                           "from": pkgid,
+                           "to": pkgids[dep],
+                           "dashes": True,
+                           "color": "rgb(255,235,59)"}
+                    ids += 1
+
+
+def iter_cluster_nodes(dbinfo, args, clustering, first):
+    graph = dbinfo.graph
+    for cid, (key, members) in enumerate(zip(clustering.keys,
+                                             clustering.members)):
+        names = sorted(graph.names[x] for x in members)
+        desc = ", ".join(names[:CLUSTER_NAMES])
+        if len(names) > CLUSTER_NAMES:
+            desc += ", ..."
+        node = {"id": first + cid,
+                "label": "%s (%d)" % (key, len(members)),
+                "level": max(graph.level[x] for x in members),
+                "group": "cluster",
+                "isize": sum(graph.isize[x] for x in members),
+                # exact for circles, whose members share them
+                "csize": max(graph.csize[x] for x in members),
+                "cssize": max(graph.cssize[x] for x in members),
+                "deps": [],
+                "reqs": [],
+                "optdeps": [],
+                "groups": "",
+                "provides": "",
+                "desc": "%d packages: %s" % (len(members), desc),
+                "version": "",
+                "repo": args.aggregate,
+                "cluster": key,
+                }
+        if dbinfo.layout is not None:
+            node["x"] = round(sum(float(dbinfo.layout[0][x])
+                                  for x in members) / len(members), 1)
+            node["y"] = round(sum(float(dbinfo.layout[1][x])
+                                  for x in members) / len(members), 1)
+        yield node
+
+
+def iter_cluster_links(dbinfo, args, pkgs, singles, node_ids):
+    """ links between the ids in `node_ids`, one per pair with the
+    number of edges as value """
+    graph = dbinfo.graph
+    ids = 0
+    for pkg in singles:
+        if pkg.ndeps == 0 and pkg.nreqs == 0:
+            yield {"id": ids, "from": node_ids[pkg.id], "to": 0}
+            ids += 1
+    sources = [pkg.id for pkg in pkgs if pkg.ndeps < args.maxdeps]
+
+    def deps(node):
+        return [x for x in graph.deps(node) if graph.nreqs(x) < args.maxreqs]
+
+    for src, dst, count in cluster_edges(sources, deps, node_ids.get):
+        yield {"id": ids, "from": src, "to": dst, "value": count,
+               "title": "%d depends" % count}
+        ids += 1
+    for src, dst, count in cluster_edges(sources, graph.optdeps,
+                                         node_ids.get):
+        yield {"id": ids, "from": src, "to": dst, "value": count,
+               "title": "%d optdepends" % count,
+               "dashes": True,
+               "color": "rgb(255,235,59)"}
+        ids += 1
+
+
+def aggregated_items(dbinfo, args, pkgs):
+    """ nodes and links with the clusters args.aggregate asks for
+    collapsed into one node each, except those in args.expand """
+    pkgs = [pkg for pkg in pkgs if pkg.level < args.maxlevel]
+    expand = set(filter(None, args.expand.split(",")))
+    clustering = cluster_nodes(dbinfo, [pkg.id for pkg in pkgs],
+                               args.aggregate, expand)
+    singles = [pkg for pkg in pkgs if pkg.id not in clustering.cluster_of]
+    pkgids = assign_ids(singles)
+    # cluster ids follow those of the single nodes
+    first = len(singles) + 1
+    node_ids = {pkg.id: pkgids[pkg.name] for pkg in singles}
+    for node, cid in clustering.cluster_of.items():
+        node_ids[node] = first + cid
+    return (itertools.chain(iter_nodes(dbinfo, args, singles, pkgids),
+                            iter_cluster_nodes(dbinfo, args, clustering,
+                                               first)),
+            iter_cluster_links(dbinfo, args, pkgs, singles, node_ids))
+
+
+def graph_items(dbinfo, args):
+    """ iterators over the nodes and the links of the view in `args` """
+    pkgs = level_order(dbinfo, select_nodes(dbinfo, args))
+    if args.aggregate:
+        if args.aggregate not in AGGREGATE_MODES:
+            raise ValueError("unknown aggregate mode %s" % args.aggregate)
+        return aggregated_items(dbinfo, args, pkgs)
+    pkgids = assign_ids(pkgs)
+    return (iter_nodes(dbinfo, args, pkgs, pkgids),
+            iter_links(dbinfo, args, pkgs, pkgids))
+
+
+def chunked(items, size=CHUNK_SIZE):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def graph_data(dbinfo, args):
+    """ the whole graph as one {"nodes": [...], "links": [...]} object """
+    nodes, links = graph_items(dbinfo, args)
+    data = {"nodes": list(nodes), "links": list(links)}
+    print_message("Graph rendered")
+    return data
+
+
+def iter_graph_lines(dbinfo, args, size=CHUNK_SIZE, stats=None):
+    """ newline delimited JSON, one {"nodes": [...]} or {"links": [...]}
+    object per chunk, nodes first. `stats` gets the number of nodes and
+    links and the seconds spent producing them, not waiting between
+    lines. """
+    if stats is None:
+        stats = {}
+    stats.update(nodes=0, links=0, seconds=0.0)
+    start = perf_counter()
+    nodes, links = graph_items(dbinfo, args)
+    for key, items in (("nodes", nodes), ("links", links)):
+        for chunk in chunked(items, size):
+            stats[key] += len(chunk)
+            line = json.dumps({key: chunk}) + "\n"
+            stats["seconds"] += perf_counter() - start
+            yield line
+            start = perf_counter()
+    stats["seconds"] += perf_counter() - start
+    print_message("Graph sent")
@@ -0,0 +1,118 @@
+import heapq
+import bisect
+from array import array
+
+# results per page unless the request asks for another limit, and the most
+# it may ask for
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# how a node matches a query, best ranked first
+MATCHES = ("exact", "prefix", "name", "provides", "description")
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """ Lower case names, provides and descriptions of the nodes of a
+    DbInfo. Names and provided names are also kept sorted for prefix
+    lookups, and each trigram of the three lists the nodes whose text
+    contains it, in node order, for substring lookups. """
+
+    def __init__(self, dbinfo):
+        self.dbinfo = dbinfo
+        self.names = []
+        self.provides = []
+        self.descs = []
+        prefixes = []
+        postings = {}
+        for pkg in dbinfo.all_pkgs.values():
+            name = pkg.name.lower()
+            provides = [pro.lower() for pro in pkg.provides]
+            desc = (pkg.desc or "").lower()
+            self.names.append(name)
+            self.provides.append(provides)
+            self.descs.append(desc)
+            prefixes.append((name, pkg.id))
+            prefixes.extend((pro, pkg.id) for pro in provides)
+            for gram in trigrams("\n".join([name] + provides + [desc])):
+                nodes = postings.get(gram)
+                if nodes is None:
+                    nodes = postings[gram] = array('i')
+                nodes.append(pkg.id)
+        prefixes.sort()
+        self.prefix_keys = [key for key, node in prefixes]
+        self.prefix_nodes = array('i', [node for key, node in prefixes])
+        self.postings = postings
+
+    def candidates(self, query):
+        """ nodes that may match `query`, a superset of the matches """
+        if len(query) < 3:
+            # too short for trigrams, only prefixes of names and provides
+            start = bisect.bisect_left(self.prefix_keys, query)
+            end = bisect.bisect_left(self.prefix_keys, query + "\uffff")
+            return set(self.prefix_nodes[start:end])
+        lists = sorted((self.postings.get(gram, ()) for gram in
+                        trigrams(query)), key=len)
+        nodes = set(lists[0])
+        for other in lists[1:]:
+            # checking a few candidates beats walking a long list
+            if len(other) > 8 * len(nodes):
+                break
+            nodes.intersection_update(other)
+        return nodes
+
+    def match(self, node, query):
+        """ index into MATCHES of how `node` matches `query`, or None """
+        name = self.names[node]
+        if name == query:
+            return 0
+        if name.startswith(query):
+            return 1
+        if query in name:
+            return 2
+        if any(query in pro for pro in self.provides[node]):
+            return 3
+        if query in self.descs[node]:
+            return 4
+        return None
+
+    def search(self, query, offset=0, limit=PAGE_SIZE):
+        """ (total, [(match, node)]) of the nodes matching `query` from
+        `offset` on, ranked by match, then shorter and sorted names """
+        query = query.strip().lower()
+        if not query:
+            return 0, []
+        ranked = []
+        for node in self.candidates(query):
+            match = self.match(node, query)
+            if match is not None:
+                name = self.names[node]
+                ranked.append((match, len(name), name, node))
+        page = heapq.nsmallest(offset + limit, ranked)[offset:]
+        return len(ranked), [(match, node) for match, _, _, node in page]
+
+
+def search_index(dbinfo):
+    """ the SearchIndex of `dbinfo`, built on first use """
+    if dbinfo.search_index is None:
+        dbinfo.search_index = SearchIndex(dbinfo)
+    return dbinfo.search_index
+
+
+def search_data(dbinfo, query, offset=0, limit=PAGE_SIZE):
+    """ the /api/search result, a page of ranked results """
+    total, results = search_index(dbinfo).search(query, offset, limit)
+    items = []
+    for match, node in results:
+        pkg = dbinfo.view(node)
+        items.append({"name": pkg.name,
+                      "match": MATCHES[match],
+                      "level": pkg.level,
+                      "version": pkg.version,
+                      "desc": pkg.desc,
+                      "provides": pkg.provides})
+    return {"q": query, "total": total, "offset": offset, "limit": limit,
+            "results": items}
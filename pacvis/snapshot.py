@@ -0,0 +1,215 @@
+import os
+import sys
+import json
+import mmap
+import struct
+import hashlib
+import tempfile
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .console import print_message
+from .graph import Condensation, PackageGraph
+from .infos import AbbsDB, DbInfo, Package
+
+MAGIC = b"PACVISSN"
+# bump whenever the layout or the meaning of a section changes
+VERSION = 5
+# magic, version, length of the JSON metadata following the header
+HEADER = struct.Struct("<8sII")
+ALIGN = 8
+
+
+def checksum(db):
+    digest = hashlib.sha256()
+    with open(db, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def snapshot_path(db, options):
+    """ one snapshot per combination of graph options, next to the db """
+    return "%s.%s.pacvis" % (db, "".join("1" if opt else "0"
+                                         for opt in options))
+
+
+def aligned(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def csr(lists):
+    offsets, values = array('i', [0]), array('i')
+    for items in lists:
+        values.extend(items)
+        offsets.append(len(values))
+    return offsets, values
+
+
+def sections(dbinfo):
+    graph = dbinfo.graph
+    condensation = dbinfo.condensation
+    result = [("graph." + name, values)
+              for name, values in zip(PackageGraph.ARRAYS, graph.arrays())]
+    offsets, members = csr(condensation.components)
+    result.append(("component_offsets", offsets))
+    result.append(("component_members", members))
+    result.append(("component_of", array('i', (
+        condensation.component_of[node] for node in range(len(graph))))))
+    offsets, targets = csr(condensation.edges)
+    result.append(("edge_offsets", offsets))
+    result.append(("edge_targets", targets))
+    if dbinfo.layout is not None:
+        for axis, coords in zip("xy", dbinfo.layout):
+            result.append(("layout." + axis, array('d', coords.tobytes())))
+    return result
+
+
+def write_snapshot(dbinfo, path, digest, options):
+    """ Write the processed graph of `dbinfo`: JSON metadata with the
+    names and packages, then every array raw and aligned, so that the
+    arrays can be used straight from a memory map. """
+    arrays = sections(dbinfo)
+    descriptors = []
+    offset = 0
+    for name, values in arrays:
+        descriptors.append((name, values.typecode, offset, len(values)))
+        offset = aligned(offset + len(values) * values.itemsize)
+    meta = json.dumps({
+        "checksum": digest,
+        "options": list(options),
+        "names": dbinfo.graph.names,
+        "packages": dbinfo.graph.packages,
+        "arrays": descriptors,
+    }).encode()
+    start = aligned(HEADER.size + len(meta))
+    # a temporary file of its own for each writer, e.g. of several server
+    # processes, and readers never see a half written snapshot
+    fd, tmppath = tempfile.mkstemp(suffix=".tmp",
+                                   prefix=os.path.basename(path) + ".",
+                                   dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            # readable like a snapshot written with open()
+            os.fchmod(f.fileno(), 0o644)
+            f.write(HEADER.pack(MAGIC, VERSION, len(meta)))
+            f.write(meta)
+            for (name, typecode, offset, length), (_, values) in zip(
+                    descriptors, arrays):
+                f.seek(start + offset)
+                f.write(values.tobytes())
+        os.replace(tmppath, path)
+    except BaseException:
+        os.unlink(tmppath)
+        raise
+    print_message("Wrote snapshot %s" % path)
+
+
+def expected_lengths(nnodes, arrays):
+    """ length each array of a snapshot of `nnodes` nodes must have """
+    lengths = {"graph." + name: nnodes for name in PackageGraph.ARRAYS}
+    for kind in ("dep", "req", "opt"):
+        lengths["graph.%s_offsets" % kind] = nnodes + 1
+        lengths["graph.%s_targets" % kind] = \
+            arrays["graph.%s_offsets" % kind][nnodes]
+    ncomp = len(arrays["component_offsets"]) - 1
+    lengths["component_members"] = nnodes
+    lengths["component_of"] = nnodes
+    lengths["edge_offsets"] = ncomp + 1
+    lengths["edge_targets"] = arrays["edge_offsets"][ncomp]
+    return lengths
+
+
+def read_snapshot(db, path, digest):
+    """ DbInfo loaded from the snapshot at `path`, or None if there is
+    none for this version of the format and checksum of `db`, or if it
+    is truncated or corrupt. The arrays are copy-on-write views of the
+    file mapping. """
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return None
+    try:
+        with f:
+            dbinfo = load_snapshot(db, f, digest)
+    except (OSError, ValueError, TypeError, KeyError, IndexError,
+            struct.error) as e:
+        print_message("Ignoring broken snapshot %s: %r" % (path, e))
+        return None
+    if dbinfo is not None:
+        print_message("Loaded snapshot %s" % path)
+    return dbinfo
+
+
+def load_snapshot(db, f, digest):
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    magic, version, metalen = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        return None
+    meta = json.loads(f.read(metalen))
+    if meta["checksum"] != digest:
+        return None
+    view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY))
+    start = aligned(HEADER.size + metalen)
+    arrays = {}
+    for name, typecode, offset, length in meta["arrays"]:
+        begin = start + offset
+        end = begin + length * array(typecode).itemsize
+        if begin < start or end > len(view):
+            raise ValueError("%s is truncated" % name)
+        arrays[name] = view[begin:end].cast(typecode)
+    nnodes = len(meta["names"])
+    if len(meta["packages"]) != nnodes:
+        raise ValueError("%d packages for %d names" % (
+            len(meta["packages"]), nnodes))
+    for name, length in expected_lengths(nnodes, arrays).items():
+        if len(arrays[name]) != length:
+            raise ValueError("%s has %d items, not %d" % (
+                name, len(arrays[name]), length))
+    for name, values in arrays.items():
+        if (name.startswith("layout.") and
+                len(values) != nnodes):
+            raise ValueError("%s has %d items, not %d" % (
+                name, len(values), nnodes))
+
+    packages = []
+    for row in meta["packages"]:
+        if row is None:
+            packages.append(None)
+            continue
+        name, section, version, groups, provides, depends, optdepends, \
+            desc, size = row
+        packages.append(Package(sys.intern(name), section, version,
+                                tuple(map(sys.intern, groups)),
+                                tuple(map(sys.intern, provides)),
+                                tuple(map(sys.intern, depends)),
+                                tuple(map(sys.intern, optdepends)),
+                                desc, size))
+    names = [sys.intern(name) for name in meta["names"]]
+    # only pooled once the whole snapshot parsed
+    localdb = AbbsDB(db, load=False)
+    packages = [pkg if pkg is None else localdb.add(pkg) for pkg in packages]
+
+    dbinfo = DbInfo(db, localdb)
+    dbinfo.graph = PackageGraph.from_arrays(
+        names, packages, [arrays["graph." + name]
+                          for name in PackageGraph.ARRAYS])
+    dbinfo.repo.pkgs.update(names)
+    offsets, members = arrays["component_offsets"], arrays["component_members"]
+    components = [members[offsets[cid]:offsets[cid + 1]].tolist()
+                  for cid in range(len(offsets) - 1)]
+    offsets, targets = arrays["edge_offsets"], arrays["edge_targets"]
+    edges = [targets[offsets[cid]:offsets[cid + 1]].tolist()
+             for cid in range(len(offsets) - 1)]
+    dbinfo.condensation = Condensation(components, arrays["component_of"],
+                                       edges)
+    if "layout.x" in arrays and np is not None:
+        dbinfo.layout = (np.frombuffer(arrays["layout.x"], dtype=np.float64),
+                         np.frombuffer(arrays["layout.y"], dtype=np.float64))
+    return dbinfo
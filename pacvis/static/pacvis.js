@@ -16,6 +16,13 @@ function filesize(size) {
 
 function size2value(size) { return size==0 ? 12 : Math.sqrt(Math.sqrt(size)) / 5; }
 
+// deps, reqs and optdeps list node ids, or names of nodes not loaded
+function depNames(list) {
+  return list.map(function(dep){
+    return typeof dep == "number" ? nodedata[dep].label : dep;
+  }).join(", ");
+}
+
 function createPkgListDom(list) {
   let depsdom = "";
   if (list == "")
@@ -121,12 +128,12 @@ function selectPkg(node) {
   document.getElementById("pkgdesc").innerHTML = node.desc;
   document.getElementById("pkglevel").innerHTML = node.level;
   document.getElementById("pkgrepo").innerHTML = node.repo;
-  document.getElementById("pkgdeps").innerHTML = createPkgListDom(node.deps);
-  document.getElementById("badgedep").setAttribute('data-badge', node.deps=="" ? 0 : node.deps.split(', ').length);
-  document.getElementById("pkgreqs").innerHTML = createPkgListDom(node.reqs);
-  document.getElementById("badgereq").setAttribute('data-badge', node.reqs=="" ? 0 : node.reqs.split(', ').length);
-  document.getElementById("pkgoptdeps").innerHTML = createPkgListDom(node.optdeps);
-  document.getElementById("badgeoptdep").setAttribute('data-badge', node.optdeps=="" ? 0 : node.optdeps.split(', ').length);
+  document.getElementById("pkgdeps").innerHTML = createPkgListDom(depNames(node.deps));
+  document.getElementById("badgedep").setAttribute('data-badge', node.deps.length);
+  document.getElementById("pkgreqs").innerHTML = createPkgListDom(depNames(node.reqs));
+  document.getElementById("badgereq").setAttribute('data-badge', node.reqs.length);
+  document.getElementById("pkgoptdeps").innerHTML = createPkgListDom(depNames(node.optdeps));
+  document.getElementById("badgeoptdep").setAttribute('data-badge', node.optdeps.length);
   document.getElementById("pkggroups").innerHTML = createPkgListDom(node.groups);
   document.getElementById("pkgprovides").innerHTML = node.provides;
 }
@@ -184,6 +191,50 @@ function trysearch() {
   }
 }
 
+// names the server found for the search box, including packages that
+// are not in the loaded graph
+var suggestedPkgs = new Set();
+var suggestTimer = null;
+
+function suggestPkgs() {
+  // exported pages have no server to ask
+  if (document.getElementById("graphdata"))
+    return;
+  clearTimeout(suggestTimer);
+  suggestTimer = setTimeout(function(){
+    let params = new URLSearchParams(window.location.search);
+    params.set("q", document.getElementById("search").value);
+    params.set("limit", 10);
+    fetch("api/search?" + params).then(function(response){
+      return response.ok ? response.json() : {results: []};
+    }).then(function(data){
+      let list = document.getElementById("search_results");
+      list.innerHTML = "";
+      suggestedPkgs = new Set();
+      for (let result of data.results) {
+        let option = document.createElement("option");
+        option.value = result.name;
+        option.label = result.desc;
+        list.appendChild(option);
+        suggestedPkgs.add(result.name);
+      }
+    });
+  }, 150);
+}
+
+// a found package missing from the loaded graph is shown with its
+// neighbours instead
+function openPkg() {
+  let pkgname = document.getElementById("search").value;
+  if (!suggestedPkgs.has(pkgname) ||
+      nodes.get({filter: function(node){ return node.label == pkgname; }}).length)
+    return;
+  let params = new URLSearchParams(window.location.search);
+  params.set("pkg", pkgname);
+  params.set("depth", 1);
+  window.location.search = params;
+}
+
 
 function switchsizeto(size){
   let pkgname = document.getElementById("pkgname").innerHTML;
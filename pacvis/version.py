@@ -0,0 +1,51 @@
+import re
+import functools
+
+# alternating non-digit and digit runs, as dpkg compares them
+RE_VERSION_PART = re.compile(r'(\D*)(\d*)')
+
+# weight of a non-digit character: '~' sorts before the end of a run,
+# letters before everything else
+CHAR_ORDER = {'~': -1}
+CHAR_ORDER.update((chr(c), c) for c in range(ord('A'), ord('Z') + 1))
+CHAR_ORDER.update((chr(c), c) for c in range(ord('a'), ord('z') + 1))
+
+# a missing run, the end of the string weighs 0
+EMPTY_PART = ((0,), 0)
+
+
+@functools.lru_cache(maxsize=4096)
+def run_key(nondigits):
+    """ weights of a non-digit run ended by 0, shared by all keys """
+    return tuple([CHAR_ORDER.get(c) or ord(c) + 256
+                  for c in nondigits]) + (0,)
+
+
+def part_key(part):
+    """ Tuple comparing like dpkg's verrevcmp: each non-digit run as the
+    weights of its characters ended by 0, followed by its digit run as an
+    int. Trailing empty runs are dropped and an end marker added, so
+    "1.0" == "1.00" and "1.0~rc1" < "1.0" < "1.0a". """
+    key = []
+    for nondigits, digits in RE_VERSION_PART.findall(part):
+        if nondigits or digits:
+            key.append(run_key(nondigits))
+            key.append(int(digits or 0))
+    while key[-2:] == list(EMPTY_PART):
+        del key[-2:]
+    key.extend(EMPTY_PART)
+    return tuple(key)
+
+
+def version_key(version):
+    """ Sort key of an AOSC (dpkg style) [epoch:]upstream[-release]
+    version. Keys of any two versions compare without errors. """
+    epoch, sep, rest = version.partition(':')
+    if sep and epoch.isdigit():
+        epoch = int(epoch)
+    else:
+        epoch, rest = 0, version
+    upstream, sep, release = rest.rpartition('-')
+    if not sep:
+        upstream, release = rest, ''
+    return (epoch, part_key(upstream), part_key(release))
@@ -9,10 +9,17 @@ setup(name='PacVis',
       author='Jiachen Yang',
       author_email='farseerfc@archlinuxcn.org',
       url='https://pacvis.farseerfc.me/',
-      packages=find_packages(),
+      packages=find_packages(exclude=['tests', 'tests.*']),
+      # int.bit_count in graph.closure_sizes
+      python_requires='>=3.10',
       package_data={'pacvis': ['templates/index.template.html',
                                'static/*'
                                ]},
+      extras_require={
+          'layout': ['numpy'],
+          'analytics': ['numpy'],
+          'compression': ['brotli', 'zstandard'],
+      },
       entry_points={
           'console_scripts': ['pacvis = pacvis.pacvis:main']
       },
@@ -0,0 +1,50 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from pacvis.benchmark.synthetic import SQL_CREATE_TABLES
+from pacvis.cache import build_dbinfo
+
+
+def write_db(path, packages, bases=()):
+    """ Write an abbs.db with `packages` as (name, version, depends,
+    provides) and `bases` as (name, members) """
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.executescript(SQL_CREATE_TABLES)
+    for name, version, depends, provides in packages:
+        conn.execute("INSERT INTO packages VALUES (?, 'base', 'libs', ?, "
+                     "NULL, ?)", (name, version, name + " package"))
+        conn.executemany("INSERT INTO package_dependencies VALUES "
+                         "(?, ?, '', 'PKGDEP')",
+                         [(name, dep) for dep in depends])
+        conn.executemany("INSERT INTO package_dependencies VALUES "
+                         "(?, ?, '', 'PKGREP')",
+                         [(name, pro) for pro in provides])
+    for name, members in bases:
+        conn.execute("INSERT INTO packages VALUES (?, 'base', 'bases', '1', "
+                     "NULL, ?)", (name, name + " group"))
+        conn.executemany("INSERT INTO package_dependencies VALUES "
+                         "(?, ?, '', 'PKGDEP')",
+                         [(name, member) for member in members])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def build(db, loader="python", showallvdeps=False):
+    return build_dbinfo(db, showallvdeps, True, False, True, loader=loader)
+
+
+class DbTestCase(unittest.TestCase):
+    """ a fresh directory for the databases of each test """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def db(self, packages, bases=(), name="abbs.db"):
+        return write_db(os.path.join(self.tmpdir.name, name), packages,
+                        bases)
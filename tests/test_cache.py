@@ -0,0 +1,89 @@
+import gc
+import sys
+import threading
+import unittest
+from types import SimpleNamespace
+
+from pacvis.cache import GraphCache
+from pacvis.infos import Package, PackagePool, package_pool
+from pacvis.render import DEFAULT_OPTIONS
+
+from .helpers import DbTestCase
+
+OPTIONS = SimpleNamespace(**DEFAULT_OPTIONS)
+
+
+class PackagePoolTest(DbTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # evicted graphs must leave the pool without the cyclic gc
+        gc.disable()
+        self.addCleanup(gc.enable)
+        self.before = len(package_pool)
+
+    def packages(self, prefix):
+        return [(prefix + str(i), "1", [], []) for i in range(10)]
+
+    def test_evicted_packages_leave_pool(self):
+        a = self.db(self.packages("a"), name="a.db")
+        b = self.db(self.packages("b"), name="b.db")
+        cache = GraphCache(maxentries=1, snapshots=False)
+        cache.get(a, OPTIONS)
+        self.assertEqual(len(package_pool), self.before + 10)
+        cache.get(b, OPTIONS)
+        self.assertEqual(len(package_pool), self.before + 10)
+        cache.clear()
+        self.assertEqual(len(package_pool), self.before)
+
+    def test_shared_packages_stay_until_last_owner(self):
+        a = self.db(self.packages("p"), name="a.db")
+        b = self.db(self.packages("p"), name="b.db")
+        caches = [GraphCache(snapshots=False) for _ in range(2)]
+        first = caches[0].get(a, OPTIONS)
+        second = caches[1].get(b, OPTIONS)
+        self.assertIs(first.packages[0], second.packages[0])
+        self.assertEqual(len(package_pool), self.before + 10)
+        caches[0].clear()
+        self.assertEqual(len(package_pool), self.before + 10)
+        caches[1].clear()
+        self.assertEqual(len(package_pool), self.before)
+
+
+class ConcurrentPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        # switch threads often enough to interleave the updates
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+
+    def run_threads(self, target, *args):
+        errors = []
+
+        def run():
+            try:
+                target(*args)
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_counts_survive_concurrent_owners(self):
+        pool = PackagePool()
+        packages = [Package("p%d" % i, "base-libs", "1", (), (), (), (),
+                            "", 1) for i in range(50000)]
+
+        def intern():
+            for pkg in packages:
+                pool.intern(pkg)
+        self.run_threads(intern)
+        self.assertEqual(len(pool), len(packages))
+        self.assertEqual({owners for _, owners in pool.packages.values()},
+                         {4})
+        self.run_threads(pool.release, packages)
+        self.assertEqual(len(pool), 0)
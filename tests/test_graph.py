@@ -0,0 +1,40 @@
+import random
+import unittest
+
+from pacvis.benchmark.synthetic import make_synthetic_graph
+from pacvis.graph import condense, closure_sizes, dominator_sizes
+
+
+def reachable(starts, edges, skip=None):
+    seen = {start for start in starts if start != skip}
+    stack = list(seen)
+    while stack:
+        for target in edges[stack.pop()]:
+            if target != skip and target not in seen:
+                seen.add(target)
+                stack.append(target)
+    return seen
+
+
+class SizesTest(unittest.TestCase):
+
+    def test_sizes_match_brute_force(self):
+        for seed in range(5):
+            adj = make_synthetic_graph(300, avgdeps=3, cycles=40, seed=seed)
+            condensation = condense(range(len(adj)), adj.__getitem__)
+            edges = condensation.edges
+            ncomp = len(condensation)
+            rand = random.Random(seed)
+            weights = [rand.choice([0, 1, rand.randrange(1 << 40)])
+                       for _ in range(ncomp)]
+            csizes = closure_sizes(condensation, weights)
+            cssizes = dominator_sizes(condensation, weights)
+            roots = set(range(ncomp)) - {target for targets in edges
+                                         for target in targets}
+            for cid in range(ncomp):
+                self.assertEqual(csizes[cid], sum(
+                    weights[x] for x in reachable([cid], edges)))
+                # what is left unreachable without cid is removed with it
+                kept = reachable(roots, edges, skip=cid)
+                self.assertEqual(cssizes[cid], sum(
+                    weights[x] for x in range(ncomp) if x not in kept))
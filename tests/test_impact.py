@@ -0,0 +1,53 @@
+from pacvis import impact
+
+from .helpers import DbTestCase, build
+
+# a -> b -> c -> d <- q <-> p, e -> c, x alone
+PACKAGES = [
+    ("a", "1", ["b"], []),
+    ("b", "1", ["c"], []),
+    ("c", "1", ["d"], []),
+    ("d", "1", [], []),
+    ("e", "1", ["c"], []),
+    ("p", "1", ["q"], []),
+    ("q", "1", ["p", "d"], []),
+    ("x", "1", [], []),
+]
+
+
+class ImpactTest(DbTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.dbinfo = build(self.db(PACKAGES))
+
+    def waves(self, *names):
+        return impact.impact_data(self.dbinfo, list(names))["waves"]
+
+    def test_chain(self):
+        self.assertEqual(self.waves("b"), [["b"], ["a"]])
+        self.assertEqual(self.waves("a"), [["a"]])
+        self.assertEqual(self.waves("x"), [["x"]])
+
+    def test_waves_follow_dependencies(self):
+        waves = self.waves("d")
+        self.assertEqual(sorted(sum(waves, [])),
+                         ["a", "b", "c", "d", "e", "p", "q"])
+        wave_of = {name: i for i, wave in enumerate(waves) for name in wave}
+        for name in wave_of:
+            for dep in self.dbinfo.get(name).deps:
+                if dep in wave_of and name not in ("p", "q"):
+                    self.assertLess(wave_of[dep], wave_of[name])
+        # a circle is rebuilt in one wave
+        self.assertEqual(wave_of["p"], wave_of["q"])
+        self.assertLess(wave_of["d"], wave_of["q"])
+
+    def test_seeds_overlap(self):
+        data = impact.impact_data(self.dbinfo, ["c", "b", "d"])
+        self.assertEqual(data["changed"], ["c", "b", "d"])
+        self.assertEqual(data["packages"], 7)
+        self.assertEqual(data["waves"], self.waves("d"))
+
+    def test_split_packages(self):
+        self.assertEqual(impact.split_packages(["a,b", "c", "b,,a"]),
+                         ["a", "b", "c"])
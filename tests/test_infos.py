@@ -0,0 +1,57 @@
+from pacvis.infos import LOADERS
+
+from .helpers import DbTestCase, build
+
+
+class ProvidesTest(DbTestCase):
+
+    def test_provided_package_is_no_vdep(self):
+        db = self.db([
+            ("foo", "1", [], []),
+            ("foo-compat", "1", [], ["foo"]),
+            ("app", "1", ["foo"], []),
+        ])
+        for loader in LOADERS:
+            dbinfo = build(db, loader=loader)
+            self.assertEqual(dbinfo.get("foo").deps, [])
+            self.assertEqual(dbinfo.get("foo-compat").requiredby, [])
+            self.assertEqual(dbinfo.get("foo").circledeps, ["foo"])
+            self.assertEqual(dbinfo.get("foo-compat").circledeps,
+                             ["foo-compat"])
+
+    def test_provides_itself(self):
+        db = self.db([
+            ("self", "1", [], ["self", "self=1"]),
+            ("app", "1", ["self"], []),
+        ])
+        for loader in LOADERS:
+            dbinfo = build(db, loader=loader)
+            self.assertEqual(dbinfo.get("self").deps, [])
+            self.assertEqual(dbinfo.get("self").requiredby, ["app"])
+
+    def test_vdep_links_all_providers(self):
+        db = self.db([
+            ("a", "1", [], ["sh"]),
+            ("b", "1", [], ["sh"]),
+            ("app", "1", ["sh"], []),
+        ])
+        dbinfo = build(db)
+        self.assertEqual(dbinfo.get("sh").deps, ["a", "b"])
+        self.assertEqual(dbinfo.get("app").deps, ["sh"])
+
+
+class NodeOrderTest(DbTestCase):
+
+    def test_circle_listed_at_first_visited_member(self):
+        # a group comes right after its first member, so find_circles
+        # enters the circle of a and b from the group, at b
+        db = self.db([
+            ("x", "1", [], []),
+            ("a", "1", ["b"], []),
+            ("b", "1", ["a"], []),
+        ], bases=[("g", ["x", "b"])])
+        for loader in LOADERS:
+            dbinfo = build(db, loader=loader)
+            self.assertEqual(list(dbinfo.all_pkgs), ["x", "g", "a", "b"])
+            self.assertEqual(dbinfo.get("a").circledeps, [])
+            self.assertEqual(dbinfo.get("b").circledeps, ["a", "b"])
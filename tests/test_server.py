@@ -0,0 +1,183 @@
+import gzip
+import json
+import os
+import tempfile
+from urllib.parse import urlencode
+
+from tornado.testing import AsyncHTTPTestCase, gen_test
+
+from pacvis.benchmark.synthetic import make_synthetic_db
+from pacvis.pacvis import make_app
+from pacvis.payload import payload_cache
+
+from .helpers import write_db
+from .test_impact import PACKAGES
+
+
+class GraphHandlerTest(AsyncHTTPTestCase):
+
+    def get_app(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        payload_cache.clear()
+        # nodes for several lines of the payload
+        db = make_synthetic_db(os.path.join(self.tmpdir.name, "abbs.db"),
+                               1200)
+        return make_app(db)
+
+    async def fetch_graph(self, encoding, **kwargs):
+        pieces = []
+        response = await self.http_client.fetch(
+            self.get_url("/api/graph"), decompress_response=False,
+            headers=dict(kwargs.pop("headers", {}),
+                         **{"Accept-Encoding": encoding}),
+            streaming_callback=pieces.append, **kwargs)
+        return response, pieces
+
+    @gen_test(timeout=60)
+    async def test_streamed_then_cached(self):
+        hits = payload_cache.hits
+        response, pieces = await self.fetch_graph("gzip")
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        body = b"".join(pieces)
+        lines = gzip.decompress(body).splitlines()
+        self.assertGreater(len(lines), 2)
+        nodes = sum(len(json.loads(line).get("nodes", ())) for line in lines)
+        self.assertGreater(nodes, 1200)
+        # only what was sent is kept
+        bodies, = payload_cache.entries.values()
+        self.assertEqual(list(bodies), ["gzip"])
+
+        again, pieces = await self.fetch_graph("gzip")
+        self.assertEqual(b"".join(pieces), body)
+        self.assertEqual(again.headers["Etag"], response.headers["Etag"])
+        self.assertEqual(payload_cache.hits, hits + 1)
+
+        plain, pieces = await self.fetch_graph("identity")
+        self.assertNotIn("Content-Encoding", plain.headers)
+        self.assertEqual(b"".join(pieces).splitlines(), lines)
+
+        cached, _ = await self.fetch_graph(
+            "gzip", headers={"If-None-Match": response.headers["Etag"]},
+            raise_error=False)
+        self.assertEqual(cached.code, 304)
+
+    @gen_test(timeout=60)
+    async def test_recoded_like_streamed(self):
+        _, pieces = await self.fetch_graph("identity")
+        plain = b"".join(pieces)
+        _, pieces = await self.fetch_graph("gzip")
+        recoded = b"".join(pieces)
+        payload_cache.clear()
+        _, pieces = await self.fetch_graph("gzip")
+        self.assertEqual(b"".join(pieces), recoded)
+        self.assertEqual(gzip.decompress(recoded), plain)
+
+    @gen_test(timeout=60)
+    async def test_search(self):
+        response = await self.http_client.fetch(
+            self.get_url("/api/search?q=pkg11&limit=3"))
+        data = json.loads(response.body)
+        self.assertEqual(data["total"], 111)
+        self.assertEqual([item["name"] for item in data["results"]],
+                         ["pkg11", "pkg110", "pkg111"])
+        self.assertEqual(data["results"][0]["match"], "exact")
+
+    @gen_test(timeout=60)
+    async def test_errors_are_plain_text(self):
+        for query, code, text in [
+                ("?pkg=nope", 404, b"404: no package nope\n"),
+                ("?aggregate=nope", 400, b"400: unknown aggregate mode nope\n")]:
+            response = await self.http_client.fetch(
+                self.get_url("/api/graph" + query), raise_error=False)
+            self.assertEqual(response.code, code)
+            self.assertTrue(response.headers["Content-Type"].startswith(
+                "text/plain"))
+            self.assertEqual(response.body, text)
+
+
+class QueryHandlerTest(AsyncHTTPTestCase):
+
+    def get_app(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        payload_cache.clear()
+        return make_app(write_db(os.path.join(self.tmpdir.name, "abbs.db"),
+                                 PACKAGES))
+
+    async def subgraph(self, **query):
+        """ names of the nodes and the links of a query """
+        response = await self.http_client.fetch(
+            self.get_url("/api/graph?" + urlencode(query)))
+        chunks = [json.loads(line) for line in response.body.splitlines()]
+        labels = {node["id"]: node["label"]
+                  for chunk in chunks for node in chunk.get("nodes", ())
+                  if node["id"] != 0}
+        links = {(labels[link["from"]], labels[link["to"]])
+                 for chunk in chunks for link in chunk.get("links", ())
+                 if link["from"] in labels and link["to"] in labels}
+        return set(labels.values()), links
+
+    @gen_test(timeout=60)
+    async def test_depends(self):
+        names, links = await self.subgraph(pkg="a")
+        self.assertEqual(names, {"a", "b", "c", "d"})
+        self.assertEqual(links, {("a", "b"), ("b", "c"), ("c", "d")})
+        names, _ = await self.subgraph(pkg="a", depth=1)
+        self.assertEqual(names, {"a", "b"})
+        names, _ = await self.subgraph(pkg="q")
+        self.assertEqual(names, {"p", "q", "d"})
+
+    @gen_test(timeout=60)
+    async def test_reverse(self):
+        names, _ = await self.subgraph(pkg="c", reverse="True")
+        self.assertEqual(names, {"a", "b", "c", "e"})
+        names, _ = await self.subgraph(pkg="d", reverse="True", depth=1)
+        self.assertEqual(names, {"c", "d", "q"})
+
+    @gen_test(timeout=60)
+    async def test_path(self):
+        names, links = await self.subgraph(pkg="a", pathto="d")
+        self.assertEqual(names, {"a", "b", "c", "d"})
+        self.assertEqual(links, {("a", "b"), ("b", "c"), ("c", "d")})
+        # found along requiredby the other way
+        names, _ = await self.subgraph(pkg="d", pathto="b")
+        self.assertEqual(names, {"b", "c", "d"})
+
+    @gen_test(timeout=60)
+    async def test_no_path(self):
+        for pathto in ("x", "a"):
+            names, links = await self.subgraph(pkg="e", pathto=pathto)
+            self.assertEqual((names, links), (set(), set()), pathto)
+
+    @gen_test(timeout=60)
+    async def test_unknown_package(self):
+        for query in ({"pkg": "nope"}, {"pkg": "a", "pathto": "nope"}):
+            response = await self.http_client.fetch(
+                self.get_url("/api/graph?" + urlencode(query)),
+                raise_error=False)
+            self.assertEqual(response.code, 404)
+
+    @gen_test(timeout=60)
+    async def test_impact(self):
+        response = await self.http_client.fetch(
+            self.get_url("/api/impact?pkgs=b"))
+        data = json.loads(response.body)
+        self.assertEqual(data["waves"], [["b"], ["a"]])
+        self.assertEqual(data["packages"], 2)
+        # many names go in the body
+        response = await self.http_client.fetch(
+            self.get_url("/api/impact"), method="POST",
+            body=urlencode([("pkgs", "d,e"), ("pkgs", "c")]))
+        data = json.loads(response.body)
+        self.assertEqual(data["changed"], ["d", "e", "c"])
+        self.assertEqual(data["packages"], 7)
+        self.assertEqual(sum(data["waves"], [])[0], "d")
+
+    @gen_test(timeout=60)
+    async def test_impact_errors(self):
+        for url, code in [("/api/impact", 400),
+                          ("/api/impact?pkgs=a,nope", 404)]:
+            response = await self.http_client.fetch(self.get_url(url),
+                                                    raise_error=False)
+            self.assertEqual(response.code, code, url)
@@ -0,0 +1,80 @@
+import os
+import threading
+from types import SimpleNamespace
+
+from pacvis import snapshot
+from pacvis.cache import GRAPH_OPTIONS
+from pacvis.render import DEFAULT_OPTIONS
+
+from .helpers import DbTestCase, build
+
+OPTIONS = tuple(DEFAULT_OPTIONS[opt] for opt in GRAPH_OPTIONS)
+
+
+class SnapshotTest(DbTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.path = self.db([
+            ("a", "1", ["b"], []),
+            ("b", "1", ["a", "c"], ["sh"]),
+            ("c", "1", [], []),
+            ("d", "1", ["sh"], []),
+        ])
+        self.dbinfo = build(self.path)
+        self.digest = snapshot.checksum(self.path)
+        self.snapshot = snapshot.snapshot_path(self.path, OPTIONS)
+
+    def write(self):
+        snapshot.write_snapshot(self.dbinfo, self.snapshot, self.digest,
+                                OPTIONS)
+
+    def read(self):
+        return snapshot.read_snapshot(self.path, self.snapshot, self.digest)
+
+    def test_round_trip(self):
+        self.write()
+        dbinfo = self.read()
+        self.assertEqual(dbinfo.graph.names, self.dbinfo.graph.names)
+        for name in self.dbinfo.all_pkgs:
+            old, new = self.dbinfo.get(name), dbinfo.get(name)
+            self.assertEqual((new.deps, new.level, new.circledeps),
+                             (old.deps, old.level, old.circledeps))
+
+    def test_concurrent_writers(self):
+        errors = []
+
+        def write():
+            try:
+                for _ in range(20):
+                    self.write()
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=write) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertIsNotNone(self.read())
+        self.assertEqual(sorted(os.listdir(self.tmpdir.name)),
+                         sorted(["abbs.db", os.path.basename(self.snapshot)]))
+
+    def test_broken_snapshots_are_misses(self):
+        self.write()
+        with open(self.snapshot, "rb") as f:
+            data = f.read()
+        magic, version, metalen = snapshot.HEADER.unpack_from(data)
+        meta = data[snapshot.HEADER.size:snapshot.HEADER.size + metalen]
+        body = data[snapshot.HEADER.size + metalen:]
+        shorter = meta.replace(b'"component_of", "i", ',
+                               b'"component_of", "i", 0, 1], ["x", "i", ')
+        broken = [data[:cut] for cut in range(0, len(data), 7)]
+        broken.append(data[:snapshot.HEADER.size] + b"[" + data[
+            snapshot.HEADER.size + 1:])
+        broken.append(snapshot.HEADER.pack(magic, version, len(shorter)) +
+                      shorter + body)
+        for data in broken:
+            with open(self.snapshot, "wb") as f:
+                f.write(data)
+            self.assertIsNone(self.read())
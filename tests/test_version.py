@@ -0,0 +1,58 @@
+import unittest
+
+from pacvis.infos import version_satisfies
+from pacvis.version import version_key
+
+# (older, newer) as dpkg --compare-versions orders them
+ORDERED = [
+    ("1.0", "1:0.1"),
+    ("2:1.0", "10:0.1"),
+    ("1.2.3-4", "1:1.0"),
+    ("1.0-1", "1.0-2"),
+    ("1.0-9", "1.0-10"),
+    ("1.0-10", "1.0.1-1"),
+    ("1:1.0-1", "1:1.0-1.1"),
+    ("1.0~rc1", "1.0"),
+    ("1.0~rc1-5", "1.0-1"),
+    ("2.0-1~bpo1", "2.0-1"),
+    ("1.0~~", "1.0~~a"),
+    ("1.0~~a", "1.0~"),
+    ("1.0~", "1.0"),
+    ("1.0", "1.0a"),
+    ("1.0", "1.0.0"),
+    ("1.0+git20200101", "1.0+git20210101"),
+    ("1.2-beta", "1.10-alpha"),
+]
+
+# versions dpkg considers equal
+EQUAL = [
+    ("0:1.0", "1.0"),
+    ("1.0", "1.0-0"),
+    ("1.01", "1.1"),
+    ("1:2.0-001", "1:2.0-1"),
+]
+
+
+class VersionKeyTest(unittest.TestCase):
+
+    def test_order(self):
+        for older, newer in ORDERED:
+            self.assertLess(version_key(older), version_key(newer),
+                            (older, newer))
+
+    def test_equal(self):
+        for a, b in EQUAL:
+            self.assertEqual(version_key(a), version_key(b), (a, b))
+
+    def test_sort(self):
+        versions = ["1:0.1", "1.0", "1.0-2", "1.0~rc1", "1.0-10", "0.9"]
+        self.assertEqual(sorted(versions, key=version_key),
+                         ["0.9", "1.0~rc1", "1.0", "1.0-2", "1.0-10",
+                          "1:0.1"])
+
+    def test_constraints(self):
+        self.assertTrue(version_satisfies("1:1.0", ">=", "2.0"))
+        self.assertTrue(version_satisfies("1.0-10", ">>", "1.0-9"))
+        self.assertTrue(version_satisfies("1.0-0", "=", "1.0"))
+        self.assertFalse(version_satisfies("1.0~rc1", ">=", "1.0"))
+        self.assertFalse(version_satisfies("", ">=", "1.0"))